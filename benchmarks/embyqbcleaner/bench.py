@@ -0,0 +1,250 @@
+"""
+EmbyQbCleaner 基准测试
+
+在本地模拟的 qBittorrent 上回放 Emby Webhook，统计不同种子规模下的处理耗时
+（p50/p99）、每个事件的 qBittorrent 请求数和插件的内存峰值，并执行一次已播放
+媒体项核对。
+
+需要在 MoviePilot 的运行环境中执行（依赖 app 包与 qbittorrentapi），例如：
+
+    cd /path/to/MoviePilot
+    PYTHONPATH=. python /path/to/plugins/benchmarks/embyqbcleaner/bench.py --sizes 1000,10000,50000
+
+插件的数据存储与消息通知在测试中替换为内存实现，任务日志写入临时目录，不会写入 MoviePilot 数据库。
+"""
+import argparse
+import importlib.util
+import json
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from fake_qbittorrent import FakeQbProcess  # noqa: E402
+from replay import WebhookReplayer, load_payloads, synthesize_payloads  # noqa: E402
+
+PLUGIN_PATH = Path(__file__).resolve().parents[2] / "plugins.v2" / "embyqbcleaner"
+
+
+def load_plugin_module():
+    """
+    按文件路径加载插件包
+    """
+    spec = importlib.util.spec_from_file_location("embyqbcleaner", PLUGIN_PATH / "__init__.py",
+                                                  submodule_search_locations=[str(PLUGIN_PATH)])
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["embyqbcleaner"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_bench_plugin(module, replayer_ref: list):
+    """
+    构造测试用插件：数据存储和通知使用内存实现，处理完成时通知回放器
+    """
+
+    class BenchPlugin(module.EmbyQbCleaner):
+        def __init__(self):
+            self._bench_data = {}
+            self._bench_played = []
+            self._bench_path = Path(tempfile.mkdtemp(prefix="embyqbcleaner-bench-"))
+            super().__init__()
+
+        def get_data_path(self) -> Path:
+            return self._bench_path
+
+        def get_data(self, key: str = None, *args, **kwargs):
+            return self._bench_data.get(key)
+
+        def save_data(self, key: str, value, *args, **kwargs):
+            self._bench_data[key] = value
+
+        def del_data(self, key: str, *args, **kwargs):
+            self._bench_data.pop(key, None)
+
+        def post_message(self, *args, **kwargs):
+            pass
+
+        def get_history_hash(self, file_path):
+            # 不访问MoviePilot数据库中的整理历史
+            return None
+
+        def emby_request(self, method: str, path: str, **kwargs):
+            # 已播放媒体项核对使用预置的媒体项，不访问Emby
+            if path == "/emby/Users":
+                return [{"Id": "bench"}]
+            if path.endswith("/Items"):
+                params = kwargs.get("params") or {}
+                start = int(params.get("StartIndex") or 0)
+                return {"Items": self._bench_played[start:start + int(params.get("Limit") or 0)]}
+            return None
+
+        def _handle_media_item(self, item_data: dict):
+            try:
+                super()._handle_media_item(item_data)
+            finally:
+                replayer_ref[0].mark_done(str(item_data["Item"]["Id"]))
+
+    return BenchPlugin
+
+
+def qb_stats(host: str, reset: bool = False) -> Dict[str, int]:
+    with urllib.request.urlopen(f"{host}/api/v2/_bench/{'reset' if reset else 'stats'}") as response:
+        return json.loads(response.read()).get("calls", {})
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+def run_scenario(module, torrents: int, files: int, events: int, latency: float,
+                 burst: bool, templates: List[dict]) -> dict:
+    """
+    单个规模的测试：冷启动构建索引，再回放事件
+    """
+    server = FakeQbProcess(torrents=torrents, files=files, latency=latency).start()
+    replayer_ref = [None]
+    plugin = None
+    try:
+        tracemalloc.start()
+        plugin = make_bench_plugin(module, replayer_ref)()
+        plugin.init_plugin({
+            "enabled": True,
+            "qb_host": server.host,
+            "qb_username": "admin",
+            "qb_password": "adminadmin",
+            "worker_count": 1,
+            "queue_size": max(100, events),
+            "batch_window": 0,
+            "wait_season_pack": False,
+            "send_notification": False
+        })
+        replayer_ref[0] = WebhookReplayer(plugin)
+
+        # 冷启动：首次同步并构建种子索引
+        qb_stats(server.host, reset=True)
+        start = time.perf_counter()
+        plugin.find_torrent("/media/tv/__warmup__.mkv")
+        build_time = time.perf_counter() - start
+        build_calls = sum(qb_stats(server.host).values())
+
+        # 回放事件
+        payloads = synthesize_payloads(templates, events, torrents, files)
+        qb_stats(server.host, reset=True)
+        result = replayer_ref[0].run(payloads, burst=burst)
+        calls = qb_stats(server.host)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        if plugin:
+            plugin.stop_service()
+        server.stop()
+
+    count = max(1, len(payloads))
+    return {
+        "torrents": torrents,
+        "files": files,
+        "events": len(payloads),
+        "build_s": build_time,
+        "build_calls": build_calls,
+        "p50_ms": percentile(result["latency"], 50) * 1000,
+        "p99_ms": percentile(result["latency"], 99) * 1000,
+        "intake_p99_ms": percentile(result["intake"], 99) * 1000,
+        "calls_per_event": sum(calls.values()) / count,
+        "calls": calls,
+        "peak_mb": peak / 1024 ** 2,
+        "mean_ms": statistics.mean(result["latency"]) * 1000 if result["latency"] else 0
+    }
+
+
+def run_sweep(module, torrents: int, files: int, items: int, templates: List[dict]) -> dict:
+    """
+    已播放媒体项核对：一次同步种子列表后在本地索引中匹配全部媒体项
+    """
+    server = FakeQbProcess(torrents=torrents, files=files).start()
+    plugin = None
+    try:
+        plugin = make_bench_plugin(module, [None])()
+        plugin.init_plugin({
+            "enabled": True,
+            "qb_host": server.host,
+            "qb_username": "admin",
+            "qb_password": "adminadmin",
+            "batch_window": 0,
+            "wait_season_pack": False,
+            "send_notification": False
+        })
+        payloads = synthesize_payloads(templates, items, torrents, files, seed=1)
+        # Emby按最后播放时间倒序返回
+        plugin._bench_played = [dict(payload["Item"], UserData={
+            "LastPlayedDate": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(1790000000 - n))
+        }) for n, payload in enumerate(payloads)]
+        qb_stats(server.host, reset=True)
+        start = time.perf_counter()
+        cleaned = plugin._sweep()
+        sweep_time = time.perf_counter() - start
+        calls = qb_stats(server.host)
+    finally:
+        if plugin:
+            plugin.stop_service()
+        server.stop()
+    return {"torrents": torrents, "items": len(payloads), "cleaned": cleaned, "sweep_s": sweep_time,
+            "calls": calls}
+
+
+def format_report(results: List[dict]) -> str:
+    header = f"{'种子数':>8} {'文件/种子':>9} {'事件':>6} {'建索引(s)':>10} {'建索引请求':>10} " \
+             f"{'p50(ms)':>9} {'p99(ms)':>9} {'入队p99(ms)':>11} {'请求/事件':>9} {'内存峰值(MB)':>12}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(f"{r['torrents']:>8} {r['files']:>9} {r['events']:>6} {r['build_s']:>10.2f} "
+                     f"{r['build_calls']:>10} {r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+                     f"{r['intake_p99_ms']:>11.3f} {r['calls_per_event']:>9.2f} {r['peak_mb']:>12.1f}")
+    for r in results:
+        lines.append(f"{r['torrents']} 个种子的请求分布: {json.dumps(r['calls'], ensure_ascii=False)}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EmbyQbCleaner 基准测试")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="种子数量，逗号分隔")
+    parser.add_argument("--files", type=int, default=10, help="每个种子的文件数")
+    parser.add_argument("--events", type=int, default=200, help="每个规模回放的事件数")
+    parser.add_argument("--latency", type=float, default=0.0, help="模拟qBittorrent每个请求的延迟（秒）")
+    parser.add_argument("--burst", action="store_true", help="一次性投递全部事件")
+    parser.add_argument("--sweep-items", type=int, default=50, help="每个规模核对的已播放媒体项数，0为不核对")
+    parser.add_argument("--payloads", type=Path, help="录制的Webhook负载文件（JSON Lines）")
+    parser.add_argument("--output", type=Path, help="将报告追加写入文件")
+    args = parser.parse_args()
+
+    module = load_plugin_module()
+    templates = load_payloads(args.payloads)
+    results, sweeps = [], []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        print(f"测试 {size} 个种子 ...", flush=True)
+        results.append(run_scenario(module, torrents=size, files=args.files, events=args.events,
+                                    latency=args.latency, burst=args.burst, templates=templates))
+        if args.sweep_items:
+            sweeps.append(run_sweep(module, torrents=size, files=args.files, items=args.sweep_items,
+                                    templates=templates))
+    report = format_report(results)
+    for r in sweeps:
+        report += f"\n{r['torrents']} 个种子核对 {r['items']} 个已播放媒体项: 清理 {r['cleaned']} 个，" \
+                  f"耗时 {r['sweep_s']:.2f} 秒，请求分布: {json.dumps(r['calls'], ensure_ascii=False)}"
+    print(report)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(report + "\n")
+
+
+if __name__ == "__main__":
+    main()
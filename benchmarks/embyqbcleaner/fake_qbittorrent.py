@@ -0,0 +1,227 @@
+"""
+本地模拟的 qBittorrent WebAPI，用于基准测试
+
+仅实现插件用到的接口：auth、app/version、sync/maindata、torrents/info、
+torrents/files、torrents/delete，数据为按参数生成的合成种子，可注入固定延迟。
+另提供 /_bench/stats 与 /_bench/reset 用于统计各接口的调用次数。
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import Event, Process, Value
+from typing import Dict, List, Optional
+
+
+def torrent_hash(index: int) -> str:
+    return f"{index:040x}"
+
+
+def episode_name(index: int, episode: int) -> str:
+    return f"Bench.Show.{index:05d}.S01E{episode:02d}.1080p.WEB-DL.H264-GRP.mkv"
+
+
+class FakeQbState:
+    """
+    合成的种子数据及增量同步记录
+    """
+
+    def __init__(self, torrents: int, files: int, latency: float = 0.0):
+        self.files_per_torrent = max(1, files)
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.calls: Dict[str, int] = {}
+        # 当前响应序号，种子变更时递增
+        self.rid = 1
+        self.torrents: Dict[str, dict] = {}
+        # hash -> 最后修改时的序号
+        self.modified: Dict[str, int] = {}
+        # [(序号, hash)] 已删除的种子
+        self.removed: List[tuple] = []
+        for i in range(torrents):
+            self.add_torrent(i)
+
+    def add_torrent(self, index: int):
+        h = torrent_hash(index)
+        name = f"Bench.Show.{index:05d}.S01.1080p.WEB-DL.H264-GRP"
+        size = 1024 ** 3 + index
+        if self.files_per_torrent == 1:
+            name = episode_name(index, 1)
+        content_path = f"/downloads/{name}"
+        self.torrents[h] = {
+            "hash": h,
+            "name": name,
+            "size": size * self.files_per_torrent,
+            "added_on": 1700000000 + index,
+            "uploaded": index * 1024 ** 2,
+            "tracker": "https://tracker.example.org/announce",
+            "tags": "",
+            "category": "tv",
+            "save_path": "/downloads/",
+            "content_path": content_path,
+            "ratio": 1.0,
+            "seeding_time": 86400,
+            "state": "stalledUP"
+        }
+        self.modified[h] = self.rid
+
+    def files(self, h: str) -> List[dict]:
+        torrent = self.torrents.get(h)
+        if not torrent:
+            return []
+        index = int(h, 16)
+        root = "" if self.files_per_torrent == 1 else f"{torrent['name']}/"
+        size = torrent["size"] // self.files_per_torrent
+        return [{"index": j, "name": f"{root}{episode_name(index, j + 1)}", "size": size}
+                for j in range(self.files_per_torrent)]
+
+    def delete(self, hashes: List[str]):
+        self.rid += 1
+        for h in hashes:
+            if self.torrents.pop(h, None) is not None:
+                self.modified.pop(h, None)
+                self.removed.append((self.rid, h))
+
+    def maindata(self, rid: int) -> dict:
+        if rid <= 0 or rid > self.rid:
+            return {"rid": self.rid, "full_update": True, "torrents": dict(self.torrents)}
+        changed = {h: self.torrents[h] for h, r in self.modified.items() if r > rid}
+        removed = [h for r, h in self.removed if r > rid]
+        data = {"rid": self.rid, "torrents": changed}
+        if removed:
+            data["torrents_removed"] = removed
+        return data
+
+
+class FakeQbHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 关闭Nagle算法，避免小请求的延迟确认掩盖插件本身的耗时
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, body, content_type: str = "application/json"):
+        if not isinstance(body, (str, bytes)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Set-Cookie", "SID=bench; path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch({})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = dict(urllib.parse.parse_qsl(self.rfile.read(length).decode()))
+        self._dispatch(form)
+
+    def _dispatch(self, form: dict):
+        state: FakeQbState = self.server.state
+        url = urllib.parse.urlparse(self.path)
+        params = dict(urllib.parse.parse_qsl(url.query))
+        params.update(form)
+        endpoint = url.path.replace("/api/v2/", "", 1).strip("/")
+
+        if endpoint == "_bench/stats":
+            with state.lock:
+                return self._send({"calls": state.calls, "torrents": len(state.torrents)})
+        if endpoint == "_bench/reset":
+            with state.lock:
+                state.calls = {}
+            return self._send({})
+
+        with state.lock:
+            state.calls[endpoint] = state.calls.get(endpoint, 0) + 1
+        if state.latency:
+            time.sleep(state.latency)
+
+        with state.lock:
+            if endpoint == "auth/login":
+                return self._send("Ok.", "text/plain")
+            if endpoint == "auth/logout":
+                return self._send("", "text/plain")
+            if endpoint == "app/version":
+                return self._send("v4.6.5", "text/plain")
+            if endpoint == "app/webapiVersion":
+                return self._send("2.9.3", "text/plain")
+            if endpoint == "sync/maindata":
+                return self._send(state.maindata(int(params.get("rid") or 0)))
+            if endpoint == "torrents/info":
+                torrents = list(state.torrents.values())
+                if params.get("hashes"):
+                    wanted = set(params["hashes"].split("|"))
+                    torrents = [t for t in torrents if t["hash"] in wanted]
+                if params.get("category"):
+                    torrents = [t for t in torrents if t["category"] == params["category"]]
+                if params.get("tag"):
+                    torrents = [t for t in torrents if params["tag"] in t["tags"].split(", ")]
+                return self._send(torrents)
+            if endpoint == "torrents/files":
+                return self._send(state.files(params.get("hash", "")))
+            if endpoint == "torrents/delete":
+                state.delete([h for h in params.get("hashes", "").split("|") if h])
+                return self._send("", "text/plain")
+        self.send_response(404)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+def serve(torrents: int, files: int, latency: float = 0.0, port: int = 0,
+          ready: Optional[Event] = None, bound_port: Optional[Value] = None):
+    """
+    启动模拟服务并阻塞运行
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeQbHandler)
+    server.daemon_threads = True
+    server.state = FakeQbState(torrents=torrents, files=files, latency=latency)
+    if bound_port is not None:
+        bound_port.value = server.server_port
+    if ready is not None:
+        ready.set()
+    server.serve_forever()
+
+
+class FakeQbProcess:
+    """
+    在独立进程中运行模拟服务，避免合成数据计入被测插件的内存
+    """
+
+    def __init__(self, torrents: int, files: int, latency: float = 0.0):
+        self._ready = Event()
+        self._port = Value("i", 0)
+        self._process = Process(target=serve, daemon=True,
+                                kwargs={"torrents": torrents, "files": files, "latency": latency,
+                                        "ready": self._ready, "bound_port": self._port})
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self._port.value}"
+
+    def start(self, timeout: float = 600) -> "FakeQbProcess":
+        self._process.start()
+        if not self._ready.wait(timeout):
+            raise RuntimeError("模拟qBittorrent启动超时")
+        return self
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join(timeout=5)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地模拟qBittorrent WebAPI")
+    parser.add_argument("--torrents", type=int, default=1000, help="种子数量")
+    parser.add_argument("--files", type=int, default=10, help="每个种子的文件数")
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求注入的延迟（秒）")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    print(f"模拟qBittorrent监听 http://127.0.0.1:{args.port}")
+    serve(torrents=args.torrents, files=args.files, latency=args.latency, port=args.port)
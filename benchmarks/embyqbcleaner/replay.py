@@ -0,0 +1,103 @@
+"""
+Emby Webhook 回放工具
+
+读取录制的 Emby Webhook 负载（JSON Lines，每行一个请求体），按合成种子数据
+替换媒体路径后依次投递给插件的 process_webhook，并统计每个事件从投递到处理
+完成的耗时。
+"""
+import copy
+import json
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fake_qbittorrent import episode_name
+
+# 默认的录制样本
+SAMPLE_PAYLOADS = Path(__file__).with_name("sample_payloads.jsonl")
+
+
+def load_payloads(path: Optional[Path] = None) -> List[dict]:
+    """
+    读取录制的Webhook负载
+    """
+    payloads = []
+    with open(path or SAMPLE_PAYLOADS, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                payloads.append(json.loads(line))
+    return payloads
+
+
+def synthesize_payloads(templates: List[dict], count: int, torrents: int, files: int,
+                        library: str = "/media/tv", seed: int = 0) -> List[dict]:
+    """
+    以录制负载为模板，生成指向合成种子文件的事件，每个事件对应不同的种子
+    """
+    rng = random.Random(seed)
+    targets = rng.sample(range(torrents), min(count, torrents))
+    payloads = []
+    for n, index in enumerate(targets):
+        payload = copy.deepcopy(templates[n % len(templates)])
+        episode = rng.randint(1, max(1, files))
+        name = episode_name(index, episode)
+        item = payload.setdefault("Item", {})
+        item.update({
+            "Id": str(100000 + n),
+            "Name": name.rsplit(".", 1)[0],
+            "Path": f"{library}/{name}",
+            "Size": 1024 ** 3 + index
+        })
+        payloads.append(payload)
+    return payloads
+
+
+class WebhookReplayer:
+    """
+    将负载投递给插件并等待处理完成
+    插件需在处理完成时调用 mark_done(item_id)
+    """
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self._done: Dict[str, float] = {}
+        self._cond = threading.Condition()
+
+    def mark_done(self, item_id: str):
+        with self._cond:
+            self._done[item_id] = time.perf_counter()
+            self._cond.notify_all()
+
+    def _wait(self, item_ids: List[str], timeout: float) -> bool:
+        deadline = time.time() + timeout
+        with self._cond:
+            while not all(i in self._done for i in item_ids):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def run(self, payloads: List[dict], burst: bool = False, timeout: float = 600) -> Dict[str, List[float]]:
+        """
+        回放负载，返回投递耗时和端到端处理耗时（秒）
+        burst为True时一次性投递全部事件，否则逐个投递并等待完成
+        """
+        intake, latency = [], []
+        submitted = []
+        for payload in payloads:
+            item_id = str(payload["Item"]["Id"])
+            start = time.perf_counter()
+            self.plugin.process_webhook(payload)
+            intake.append(time.perf_counter() - start)
+            submitted.append((item_id, start))
+            if not burst and not self._wait([item_id], timeout):
+                raise TimeoutError(f"事件处理超时: {item_id}")
+        if burst and not self._wait([i for i, _ in submitted], timeout):
+            raise TimeoutError("批量事件处理超时")
+        for item_id, start in submitted:
+            latency.append(self._done[item_id] - start)
+        return {"intake": intake, "latency": latency}
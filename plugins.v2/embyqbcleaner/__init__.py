@@ -1,20 +1,33 @@
 import os
+import html
 import json
 import time
 import logging
-import requests
-import qbittorrentapi
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Dict, Any, Tuple, Optional
 
+from apscheduler.triggers.cron import CronTrigger
+from fastapi.responses import PlainTextResponse
+
 from app.core.config import settings
 from app.core.event import eventmanager, Event
 from app.log import logger
 from app.plugins import _PluginBase
 from app.schemas.types import NotificationType, EventType
-from app.modules.emby import Emby
-from app.modules.jellyfin import Jellyfin
-from app.modules.plex import Plex
+
+from .batcher import DeleteBatcher
+from .breaker import CircuitBreaker, CircuitOpenError
+from .cache import LruCache, TtlCache
+from .downloader import DEFAULT_NAME, Downloader, parse_instances
+from .inodeindex import FileKey, file_key
+from .journal import CleanupJournal
+from .scheduler import DeferredDeletions
+from .library import PathPrefixTrie
+from .metrics import Metrics
+from .notifier import DeliveryRejected, NotificationDispatcher, RetryAfter
+from .workqueue import WorkerPool
 
 
 class EmbyQbCleaner(_PluginBase):
@@ -25,7 +38,7 @@ class EmbyQbCleaner(_PluginBase):
     # 插件图标
     plugin_icon = "embyqbcleaner.png"
     # 插件版本
-    plugin_version = "1.2.4"
+    plugin_version = "1.22.0"
     # 插件作者
     plugin_author = "aech"
     # 作者主页
@@ -41,25 +54,391 @@ class EmbyQbCleaner(_PluginBase):
     _enabled = False
     _delete_files = True
     _send_notification = True
-    _target_library = ""
+    # 目标媒体库ID或名称，为空时处理全部媒体库
+    _target_libraries = []
+    _qb_host = ""
+    _qb_username = ""
+    _qb_password = ""
+    # 额外的qBittorrent实例 [(名称, 地址, 用户名, 密码)]
+    _qb_instances = []
+    _emby_host = ""
+    _emby_api_key = ""
+    _emby_username = ""
+    _emby_password = ""
+    _qb_category = ""
+    _qb_tags = ""
+    _worker_count = 2
+    _queue_size = 100
+    _dedup_window = 60
+    _batch_window = 10
+    _wait_season_pack = True
+    # Emby路径到MoviePilot路径的映射 [(Emby前缀, MoviePilot前缀)]
+    _path_mappings = []
+    # 按硬链接（inode）匹配媒体文件和种子文件
+    _match_inode = False
+    # qBittorrent下载路径到MoviePilot路径的映射 [(qBittorrent前缀, MoviePilot前缀)]
+    _download_path_mappings = []
+    # MoviePilot的Emby模块和整理历史，首次使用时创建
     _emby = None
-    _jellyfin = None
-    _plex = None
+    _transferhis = None
+    # Emby令牌和媒体库缓存，封面地址单独缓存，避免大量封面地址挤出令牌
+    _emby_cache = None
+    _emby_cache_key = None
+    _image_cache = None
+    # 目标媒体库目录前缀树，以及构建时使用的媒体库列表和目标
+    _library_matcher = None
+    _library_matcher_source = None
+    # 复用的HTTP会话，首次使用时创建
+    _emby_session = None
+    _session_lock = threading.Lock()
+    # Telegram直接推送
+    _telegram_token = ""
+    _telegram_chat_id = ""
+    # 通知合并窗口（秒）
+    _notify_window = 30
+    # 通知队列及其HTTP会话
+    _notifier = None
+    _notify_session = None
+    # 缓存有效期（秒）
+    _emby_token_ttl = 12 * 3600
+    _library_ttl = 600
+    _image_ttl = 3600
+    # qBittorrent实例，各自维护会话和种子文件索引
+    _downloaders = []
+    # 运行指标
+    _metrics = None
+    # 媒体项处理队列
+    _worker_pool = None
+    # 批量删除
+    _batcher = None
+    # 季包已播放的媒体项 (实例名称, hash) -> [媒体项]
+    _pack_progress = None
+    # qBittorrent不可用时暂存的任务：媒体项 item_key -> 数据，以及待删除的条目
+    _parked = None
+    _parked_deletions = None
+    # 事件去重：最近收到的事件、处理中的媒体项
+    _recent_events = None
+    _inflight_items = None
+    _dedup_lock = None
+    # 清理任务日志，以及是否需要恢复其中未完成的任务
+    _journal = None
+    _journal_resume = False
+    # 已完成任务的保留天数
+    _journal_keep_days = 90
+    # 种子分类、标签过滤
+    _scope_filters = None
+    # 索引持久化间隔（秒）
+    _index_save_interval = 300
+    # 单次删除请求的种子数
+    _delete_chunk_size = 100
+    # 已播放媒体项核对周期，为空时不核对
+    _sweep_cron = ""
+    _sweep_lock = None
+    # 核对时每页获取的媒体项数量
+    _sweep_page_size = 500
+    # 推迟删除：最短做种时间（小时）、最低分享率，满足任一条件即可删除
+    _min_seed_hours = 0.0
+    _min_ratio = 0.0
+    # 不受做种要求限制的Tracker或标签关键字
+    _defer_exclude = []
+    _deferred = None
+    # 分享率未达标时重新检查的间隔（秒）
+    _defer_recheck = 1800
+    # 每次检查的最大种子数
+    _defer_tick_limit = 500
 
     def init_plugin(self, config: dict = None):
         """
         初始化插件
         """
-        # 初始化媒体服务器客户端
-        self._emby = Emby()
-        self._jellyfin = Jellyfin()
-        self._plex = Plex()
-        
+        if not self._metrics:
+            self._metrics = Metrics()
+            self._metrics.gauge("queue_depth", lambda: self._worker_pool.qsize if self._worker_pool else 0)
+            self._metrics.gauge("batch_pending", lambda: self._batcher.pending if self._batcher else 0)
+            self._metrics.gauge("index_torrents", lambda: sum(len(d.index) for d in self._downloaders))
+            self._metrics.gauge("journal_pending", lambda: self._journal.pending_count() if self._journal is not None else 0)
+            self._metrics.gauge("deferred_pending", lambda: len(self._deferred) if self._deferred is not None else 0)
+            self._metrics.gauge("parked_jobs", lambda: len(self._parked or {}) + len(self._parked_deletions or []))
+            self._metrics.gauge("qb_breakers_open",
+                                lambda: sum(1 for d in self._downloaders if not d.healthy))
+            self._metrics.gauge("notify_pending", lambda: self._notifier.pending if self._notifier else 0)
+
         if config:
             self._enabled = config.get("enabled", False)
             self._delete_files = config.get("delete_files", True)
             self._send_notification = config.get("send_notification", True)
-            self._target_library = config.get("target_library", "")
+            target_library = config.get("target_library") or []
+            # 兼容旧版本的单选配置
+            self._target_libraries = [target_library] if isinstance(target_library, str) else list(target_library)
+            self._emby_host = (config.get("emby_host") or "").rstrip("/")
+            self._emby_api_key = config.get("emby_api_key", "")
+            self._emby_username = config.get("emby_username", "")
+            self._emby_password = config.get("emby_password", "")
+            self._qb_host = config.get("qb_host", "")
+            self._qb_username = config.get("qb_username", "")
+            self._qb_password = config.get("qb_password", "")
+            self._qb_instances = parse_instances(config.get("qb_instances"))
+            self._qb_category = config.get("qb_category", "")
+            self._qb_tags = config.get("qb_tags", "")
+            self._worker_count = self._to_int(config.get("worker_count"), 2)
+            self._queue_size = self._to_int(config.get("queue_size"), 100)
+            self._dedup_window = self._to_int(config.get("dedup_window"), 60)
+            self._batch_window = self._to_int(config.get("batch_window"), 10)
+            self._wait_season_pack = config.get("wait_season_pack", True)
+            self._path_mappings = self._parse_path_mappings(config.get("path_mapping"))
+            self._match_inode = config.get("match_inode", False)
+            self._download_path_mappings = self._parse_path_mappings(config.get("download_path_mapping"))
+            self._sweep_cron = config.get("sweep_cron", "")
+            self._telegram_token = config.get("telegram_token", "")
+            self._telegram_chat_id = config.get("telegram_chat_id", "")
+            self._notify_window = self._to_int(config.get("notify_window"), 30)
+            self._min_seed_hours = self._to_float(config.get("min_seed_hours"), 0.0)
+            self._min_ratio = self._to_float(config.get("min_ratio"), 0.0)
+            self._defer_exclude = self._split_list(config.get("defer_exclude"))
+
+        # Emby配置变化时清空令牌和媒体库缓存
+        emby_key = (self._emby_host, self._emby_api_key, self._emby_username, self._emby_password)
+        if self._emby_cache is None or self._emby_cache_key != emby_key:
+            self._emby_cache = TtlCache(ttl=self._library_ttl, maxsize=16)
+            self._image_cache = TtlCache(ttl=self._image_ttl, maxsize=1000)
+            self._emby_cache_key = emby_key
+
+        # qBittorrent会话在首次请求时登录，配置未变化的实例保留会话和索引
+        self._scope_filters = {"categories": self._split_list(self._qb_category),
+                               "tags": self._split_list(self._qb_tags)}
+        self._init_downloaders()
+        # 去重记录、暂存任务在重新加载时保留，LruCache为空时也为假，需判断None
+        if self._recent_events is None:
+            self._recent_events = LruCache(maxsize=2000)
+            self._inflight_items = set()
+            self._parked = {}
+            self._parked_deletions = []
+            self._dedup_lock = threading.Lock()
+        if not self._sweep_lock:
+            self._sweep_lock = threading.Lock()
+        if self._pack_progress is None:
+            self._pack_progress = self._load_pack_progress(self.get_data("pack_progress"))
+
+        # 合并窗口变化时先发送已收集的通知
+        if self._notifier and self._notifier.window != self._notify_window:
+            self._notifier.stop()
+            self._notifier = None
+        # 未启用时不打开任务日志、不启动后台线程，启用后的重新加载中再初始化
+        if self._enabled:
+            if self._journal is None:
+                self._open_journal()
+            if self._deferred is None:
+                self._deferred = DeferredDeletions()
+                self._deferred.load(self.get_data("deferred_deletions"))
+            if not self._notifier:
+                self._notifier = NotificationDispatcher(window=self._notify_window,
+                                                        digest=self._digest_notifications,
+                                                        deliver=self._deliver_notification)
+                self._notifier.start()
+
+        # 批量窗口变化时先处理已收集的种子
+        if self._batcher and self._batcher.window != self._batch_window:
+            self._batcher.stop()
+            self._batcher = None
+        if not self._batcher:
+            self._batcher = DeleteBatcher(window=self._batch_window, handler=self._flush_deletions)
+
+        # 停用或处理队列配置变化时，先处理完旧队列再重建
+        if self._worker_pool and (not self._enabled or (self._worker_pool.workers, self._worker_pool.queue_size)
+                                  != (self._worker_count, self._queue_size)):
+            self._worker_pool.stop()
+            self._worker_pool = None
+        if self._enabled and not self._worker_pool:
+            self._worker_pool = WorkerPool(name="EmbyQbCleaner",
+                                           handler=self._handle_media_item,
+                                           workers=self._worker_count,
+                                           queue_size=self._queue_size)
+            self._worker_pool.start()
+        if self._worker_pool and self._journal_resume:
+            self._journal_resume = False
+            self._resume_jobs()
+
+    def _open_journal(self):
+        """
+        打开清理任务日志，首次使用时导入旧版本的已清理记录
+        """
+        self._journal = CleanupJournal(self.get_data_path() / "journal.db")
+        try:
+            self._journal.open()
+        except Exception as e:
+            logger.error(f"打开清理任务日志失败: {str(e)}")
+        legacy = self.get_data("cleaned_items")
+        if legacy:
+            self._journal.import_done(dict(legacy))
+            self.del_data("cleaned_items")
+        self._journal.prune(self._journal_keep_days)
+        self._journal_resume = True
+
+    def _resume_jobs(self):
+        """
+        恢复上次退出时未完成的任务：已删除未通知的补发通知，其余重新加入处理队列
+        """
+        jobs = self._journal.pending()
+        if not jobs:
+            return
+        logger.info(f"恢复 {len(jobs)} 个未完成的清理任务")
+        deleted = [job for job in jobs if job["state"] == CleanupJournal.DELETED]
+        if deleted:
+            self.send_cleanup_notification([dict(job["entry"], item_data=job["item_data"]) for job in deleted], True)
+            self._journal.set_state([job["item_key"] for job in deleted], CleanupJournal.NOTIFIED)
+        for job in jobs:
+            if job["state"] == CleanupJournal.DELETED or not job["item_data"]:
+                continue
+            # 推迟删除的种子由定时检查继续处理
+            if (job["downloader"], job["hash"]) in self._deferred:
+                continue
+            with self._dedup_lock:
+                self._inflight_items.add(job["item_key"])
+            if not self._worker_pool.submit(job["item_data"]):
+                # 队列已满，保留记录待下次启动时处理
+                with self._dedup_lock:
+                    self._inflight_items.discard(job["item_key"])
+
+    def _init_downloaders(self):
+        """
+        按配置建立qBittorrent实例，配置未变化的实例保留会话和索引
+        """
+        configs = []
+        if self._qb_host:
+            configs.append((DEFAULT_NAME, self._qb_host, self._qb_username, self._qb_password))
+        for instance in self._qb_instances:
+            if instance[0] in [c[0] for c in configs]:
+                logger.warning(f"qBittorrent实例名称重复，已忽略: {instance[0]}")
+                continue
+            configs.append(instance)
+        existing = {downloader.key: downloader for downloader in self._downloaders}
+        downloaders = []
+        for name, host, username, password in configs:
+            downloader = existing.pop((name, host, username, password), None) \
+                or Downloader(name=name, host=host, username=username, password=password, metrics=self._metrics)
+            downloader.index.set_filters(**self._scope_filters)
+            downloaders.append(downloader)
+        # 配置已删除或变化的实例，保存索引后关闭会话
+        for downloader in existing.values():
+            self._persist_index(downloader, force=True)
+            downloader.close()
+        self._downloaders = downloaders
+
+    @staticmethod
+    def _to_int(value, default: int) -> int:
+        try:
+            return int(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _to_float(value, default: float) -> float:
+        try:
+            return float(value) if value not in (None, "") else default
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _split_list(text: str) -> List[str]:
+        """
+        拆分逗号分隔的配置项
+        """
+        return [v.strip() for v in (text or "").replace("，", ",").split(",") if v.strip()]
+
+    @staticmethod
+    def _parse_path_mappings(text: str) -> List[Tuple[str, str]]:
+        """
+        解析路径映射配置，每行一条：源路径#目标路径
+        """
+        mappings = []
+        for line in (text or "").splitlines():
+            if "#" not in line:
+                continue
+            src, dst = line.split("#", 1)
+            if src.strip() and dst.strip():
+                mappings.append((src.strip().rstrip("/\\"), dst.strip().rstrip("/\\")))
+        # 优先匹配更长的前缀
+        return sorted(mappings, key=lambda m: len(m[0]), reverse=True)
+
+    @staticmethod
+    def _map_path(path: str, mappings: List[Tuple[str, str]]) -> str:
+        """
+        按前缀替换路径
+        """
+        for src, dst in mappings:
+            if path == src or path.startswith(src + "/") or path.startswith(src + "\\"):
+                return dst + path[len(src):]
+        return path
+
+    @staticmethod
+    def _item_key(item_data: dict) -> str:
+        item = item_data.get("Item") or {}
+        return str(item.get("Id") or item.get("Path") or "")
+
+    def submit_media_item(self, item_data: dict) -> bool:
+        """
+        将媒体项加入处理队列，立即返回；同一媒体项的重复事件在去重窗口内合并
+        """
+        if not self._worker_pool:
+            logger.warning("处理队列未启动，跳过媒体项")
+            return False
+        item_key = self._item_key(item_data)
+        if item_key:
+            # 已有任务记录的媒体项直接由任务日志应答，不再访问qBittorrent
+            job = self._journal.get(item_key)
+            if job and job["state"] in (CleanupJournal.DELETED, CleanupJournal.NOTIFIED):
+                logger.info(f"媒体项已清理过，跳过: {item_key}")
+                self._metrics.inc("events", result="cleaned")
+                return True
+            if job:
+                logger.info(f"媒体项已在处理中，跳过: {item_key}")
+                self._metrics.inc("events", result="duplicate")
+                return True
+            now = time.time()
+            with self._dedup_lock:
+                last_time = self._recent_events.get(item_key)
+                if item_key in self._inflight_items \
+                        or (last_time and now - last_time < self._dedup_window):
+                    logger.info(f"合并重复的播放事件: {item_key}")
+                    self._metrics.inc("events", result="duplicate")
+                    return True
+                self._recent_events.set(item_key, now)
+                self._inflight_items.add(item_key)
+            self._journal.receive(item_key, item_data)
+        if not self._worker_pool.submit(item_data):
+            with self._dedup_lock:
+                self._inflight_items.discard(item_key)
+                self._recent_events.pop(item_key)
+            if item_key:
+                self._journal.remove(item_key)
+            self._metrics.inc("events", result="rejected")
+            return False
+        self._metrics.inc("events", result="queued")
+        return True
+
+    def _handle_media_item(self, item_data: dict):
+        """
+        队列任务入口，处理完成后释放去重标记
+        """
+        item_key = self._item_key(item_data)
+        try:
+            with self._metrics.timer("process_item"):
+                self.process_media_item(item_data)
+        finally:
+            with self._dedup_lock:
+                self._inflight_items.discard(item_key)
+                parked = item_key in self._parked
+            # 未匹配到种子的任务不保留记录，之后的事件重新处理；暂存的任务等待重试
+            job = self._journal.get(item_key) if item_key and not parked else None
+            if job and job["state"] == CleanupJournal.RECEIVED:
+                self._journal.remove(item_key)
+
+    @staticmethod
+    def _journal_entry(entry: dict) -> dict:
+        """
+        写入任务日志的删除条目，媒体项数据单独保存
+        """
+        return {k: v for k, v in entry.items() if k != "item_data"}
 
     def get_command(self) -> List[Dict[str, Any]]:
         """
@@ -77,9 +456,21 @@ class EmbyQbCleaner(_PluginBase):
                 "endpoint": self.process_webhook,
                 "methods": ["POST"],
                 "summary": "处理Emby Webhook"
+            },
+            {
+                "path": "/metrics",
+                "endpoint": self.get_metrics,
+                "methods": ["GET"],
+                "summary": "运行指标（Prometheus格式）"
             }
         ]
 
+    def get_metrics(self):
+        """
+        导出Prometheus格式的运行指标
+        """
+        return PlainTextResponse(self._metrics.to_prometheus(), media_type="text/plain; version=0.0.4")
+
     def process_webhook(self, data: dict):
         """
         处理Emby Webhook请求
@@ -92,8 +483,9 @@ class EmbyQbCleaner(_PluginBase):
             
             # 处理播放相关事件
             if event in ["playback.stop", "item.played", "item.markplayed"]:
-                self.process_media_item(data)
-                return {"status": "success", "message": "事件已处理"}
+                if not self.submit_media_item(data):
+                    return {"status": "error", "message": "处理队列已满"}
+                return {"status": "success", "message": "事件已加入处理队列"}
             else:
                 return {"status": "ignored", "message": f"不是播放相关事件: {event}"}
         except Exception as e:
@@ -104,20 +496,44 @@ class EmbyQbCleaner(_PluginBase):
         """
         注册插件公共服务
         """
-        return []
+        if not self._enabled:
+            return []
+        services = []
+        if self._sweep_cron:
+            try:
+                services.append({
+                    "id": "EmbyQbCleanerSweep",
+                    "name": "已播放媒体项核对",
+                    "trigger": CronTrigger.from_crontab(self._sweep_cron),
+                    "func": self.sweep_played_items,
+                    "kwargs": {}
+                })
+            except Exception as e:
+                logger.error(f"已播放媒体项核对周期配置错误: {str(e)}")
+        services.append({
+            "id": "EmbyQbCleanerRetry",
+            "name": "暂存任务重试",
+            "trigger": "interval",
+            "func": self.retry_parked,
+            "kwargs": {"minutes": 1}
+        })
+        # 配置了做种要求，或仍有推迟删除的种子时定时检查
+        if self._min_seed_hours or self._min_ratio or len(self._deferred):
+            services.append({
+                "id": "EmbyQbCleanerDeferred",
+                "name": "推迟删除检查",
+                "trigger": "interval",
+                "func": self.check_deferred,
+                "kwargs": {"minutes": 1}
+            })
+        return services
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """
         拼装插件配置页面
         """
         # 获取已配置的媒体库
-        libraries = []
-        if self._emby:
-            try:
-                # 使用 Emby 类的 get_library_list 方法获取媒体库列表
-                libraries = self._emby.get_library_list()
-            except Exception as e:
-                logger.error(f"获取媒体库列表失败: {str(e)}")
+        libraries = self.get_libraries()
 
         return [
             {
@@ -134,10 +550,485 @@ class EmbyQbCleaner(_PluginBase):
                                 },
                                 'content': [
                                     {
-                                        'component': 'VSwitch',
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'enabled',
+                                            'label': '启用插件',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'delete_files',
+                                            'label': '删除文件',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'send_notification',
+                                            'label': '发送通知',
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'notify_window',
+                                            'label': '通知合并窗口（秒）',
+                                            'type': 'number',
+                                            'hint': '窗口内的清理合并为一条摘要通知，0为不合并',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'telegram_token',
+                                            'label': 'Telegram Bot Token',
+                                            'type': 'password',
+                                            'hint': '可选，直接推送到Telegram，与MoviePilot消息通知独立',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'telegram_chat_id',
+                                            'label': 'Telegram Chat ID'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'emby_host',
+                                            'label': 'Emby地址',
+                                            'placeholder': 'http://127.0.0.1:8096'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'emby_api_key',
+                                            'label': 'Emby API密钥',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'emby_username',
+                                            'label': 'Emby用户名',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 3
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'emby_password',
+                                            'label': 'Emby密码',
+                                            'type': 'password'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'qb_host',
+                                            'label': 'qBittorrent地址',
+                                            'placeholder': 'http://127.0.0.1:8080'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'qb_username',
+                                            'label': 'qBittorrent用户名',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'qb_password',
+                                            'label': 'qBittorrent密码',
+                                            'type': 'password'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextarea',
+                                        'props': {
+                                            'model': 'qb_instances',
+                                            'label': '更多qBittorrent实例',
+                                            'rows': 2,
+                                            'placeholder': '每行一个，格式：名称#地址#用户名#密码',
+                                            'hint': '多个实例同时查找，优先采用文件名和大小一致的结果',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'qb_category',
+                                            'label': '种子分类',
+                                            'placeholder': '多个分类用逗号分隔，留空不限制',
+                                            'hint': '仅清理指定分类的种子',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'qb_tags',
+                                            'label': '种子标签',
+                                            'placeholder': '多个标签用逗号分隔，留空不限制',
+                                            'hint': '仅清理带有任一指定标签的种子',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'worker_count',
+                                            'label': '并发处理数',
+                                            'type': 'number',
+                                            'hint': '同时处理的媒体项数量',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'queue_size',
+                                            'label': '队列长度',
+                                            'type': 'number',
+                                            'hint': '等待处理的事件上限，超出时丢弃',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'dedup_window',
+                                            'label': '去重窗口（秒）',
+                                            'type': 'number',
+                                            'hint': '窗口内同一媒体项的重复播放事件只处理一次',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'batch_window',
+                                            'label': '批量删除窗口（秒）',
+                                            'type': 'number',
+                                            'hint': '窗口内匹配到的种子合并为一次删除和一条通知，0为立即删除',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'wait_season_pack',
+                                            'label': '季包播放完毕后再删除',
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'match_inode',
+                                            'label': '按硬链接匹配种子',
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'model': 'target_library',
+                                            'label': '目标媒体库',
+                                            'multiple': True,
+                                            'chips': True,
+                                            'hint': '按媒体库目录匹配，留空处理全部媒体库',
+                                            'persistent-hint': True,
+                                            'items': [{'title': lib.get('Name', ''), 'value': lib.get('Id', '')} for lib in libraries]
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 6
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VCronField',
+                                        'props': {
+                                            'model': 'sweep_cron',
+                                            'label': '已播放媒体项核对周期',
+                                            'placeholder': '0 3 * * *',
+                                            'hint': '定期从Emby获取新播放的媒体项，清理Webhook丢失时遗漏的种子，留空不核对',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
                                         'props': {
-                                            'model': 'enabled',
-                                            'label': '启用插件',
+                                            'model': 'min_seed_hours',
+                                            'label': '最短做种时间（小时）',
+                                            'type': 'number',
+                                            'hint': '未达到做种要求的种子推迟删除，0为不限制',
+                                            'persistent-hint': True
                                         }
                                     }
                                 ]
@@ -150,10 +1041,13 @@ class EmbyQbCleaner(_PluginBase):
                                 },
                                 'content': [
                                     {
-                                        'component': 'VSwitch',
+                                        'component': 'VTextField',
                                         'props': {
-                                            'model': 'delete_files',
-                                            'label': '删除文件',
+                                            'model': 'min_ratio',
+                                            'label': '最低分享率',
+                                            'type': 'number',
+                                            'hint': '与做种时间满足任一即可删除，0为不限制',
+                                            'persistent-hint': True
                                         }
                                     }
                                 ]
@@ -166,10 +1060,13 @@ class EmbyQbCleaner(_PluginBase):
                                 },
                                 'content': [
                                     {
-                                        'component': 'VSwitch',
+                                        'component': 'VTextField',
                                         'props': {
-                                            'model': 'send_notification',
-                                            'label': '发送通知',
+                                            'model': 'defer_exclude',
+                                            'label': '不限制做种的Tracker或标签',
+                                            'placeholder': '多个关键字用逗号分隔',
+                                            'hint': 'Tracker地址包含关键字或带有指定标签的种子立即删除',
+                                            'persistent-hint': True
                                         }
                                     }
                                 ]
@@ -186,11 +1083,38 @@ class EmbyQbCleaner(_PluginBase):
                                 },
                                 'content': [
                                     {
-                                        'component': 'VSelect',
+                                        'component': 'VTextarea',
                                         'props': {
-                                            'model': 'target_library',
-                                            'label': '目标媒体库',
-                                            'items': [{'title': lib.get('Name', ''), 'value': lib.get('Id', '')} for lib in libraries]
+                                            'model': 'path_mapping',
+                                            'label': '路径映射',
+                                            'rows': 2,
+                                            'placeholder': '每行一条，格式：Emby媒体路径#MoviePilot媒体路径',
+                                            'hint': 'Emby与MoviePilot看到的媒体库路径不同时配置，用于匹配整理历史',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextarea',
+                                        'props': {
+                                            'model': 'download_path_mapping',
+                                            'label': '下载路径映射',
+                                            'rows': 2,
+                                            'placeholder': '每行一条，格式：qBittorrent下载路径#MoviePilot下载路径',
+                                            'hint': '按硬链接匹配时需要读取种子文件，qBittorrent与MoviePilot看到的下载路径不同时配置',
+                                            'persistent-hint': True
                                         }
                                     }
                                 ]
@@ -224,14 +1148,219 @@ class EmbyQbCleaner(_PluginBase):
             "enabled": False,
             "delete_files": True,
             "send_notification": True,
-            "target_library": ""
+            "notify_window": 30,
+            "telegram_token": "",
+            "telegram_chat_id": "",
+            "target_library": [],
+            "emby_host": "",
+            "emby_api_key": "",
+            "emby_username": "",
+            "emby_password": "",
+            "qb_host": "",
+            "qb_username": "",
+            "qb_password": "",
+            "qb_instances": "",
+            "qb_category": "",
+            "qb_tags": "",
+            "worker_count": 2,
+            "queue_size": 100,
+            "dedup_window": 60,
+            "batch_window": 10,
+            "wait_season_pack": True,
+            "match_inode": False,
+            "sweep_cron": "",
+            "min_seed_hours": 0,
+            "min_ratio": 0,
+            "defer_exclude": "",
+            "path_mapping": "",
+            "download_path_mapping": ""
         }
 
     def get_page(self) -> List[dict]:
         """
         拼装插件详情页面
         """
-        return []
+        if not self._metrics:
+            return []
+        snapshot = self._metrics.snapshot()
+        
+        # 概览
+        summary = [
+            ("处理队列", int(snapshot["gauges"].get("queue_depth", 0))),
+            ("待批量删除", int(snapshot["gauges"].get("batch_pending", 0))),
+            ("推迟删除", int(snapshot["gauges"].get("deferred_pending", 0))),
+            ("暂存任务", int(snapshot["gauges"].get("parked_jobs", 0))),
+            ("索引种子数", int(snapshot["gauges"].get("index_torrents", 0))),
+            ("qBittorrent请求", int(self._metrics.counter_total("http_requests", target="qbittorrent"))),
+            ("Emby请求", int(self._metrics.counter_total("http_requests", target="emby"))),
+            ("缓存命中/未命中", f"{int(self._metrics.counter_total('cache_requests', result='hit'))}"
+                            f"/{int(self._metrics.counter_total('cache_requests', result='miss'))}")
+        ]
+        cards = [{
+            'component': 'VCol',
+            'props': {
+                'cols': 6,
+                'md': 2
+            },
+            'content': [
+                {
+                    'component': 'VCard',
+                    'props': {
+                        'variant': 'tonal'
+                    },
+                    'content': [
+                        {
+                            'component': 'VCardText',
+                            'props': {
+                                'class': 'text-center'
+                            },
+                            'content': [
+                                {
+                                    'component': 'div',
+                                    'props': {
+                                        'class': 'text-h6'
+                                    },
+                                    'text': str(value)
+                                },
+                                {
+                                    'component': 'div',
+                                    'props': {
+                                        'class': 'text-caption'
+                                    },
+                                    'text': label
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ]
+        } for label, value in summary]
+        
+        # 各qBittorrent实例的熔断状态和并发限制
+        instances = []
+        for downloader in self._downloaders:
+            breaker, limiter = downloader.session.breaker, downloader.session.limiter
+            retry_at = time.strftime("%H:%M:%S", time.localtime(breaker.retry_at)) if breaker.retry_at else "-"
+            instances.append({
+                'component': 'tr',
+                'content': [
+                    {'component': 'td', 'text': downloader.name},
+                    {'component': 'td', 'text': CircuitBreaker.STATE_NAMES.get(breaker.state, breaker.state)},
+                    {'component': 'td', 'text': str(breaker.failures)},
+                    {'component': 'td', 'text': retry_at},
+                    {'component': 'td', 'text': f"{limiter.inflight}/{limiter.limit}"}
+                ]
+            })
+
+        # 各阶段耗时
+        rows = [{
+            'component': 'tr',
+            'content': [
+                {'component': 'td', 'text': stage},
+                {'component': 'td', 'text': str(stats["count"])},
+                {'component': 'td', 'text': f"{stats['avg'] * 1000:.1f}"},
+                {'component': 'td', 'text': f"{stats['p50'] * 1000:.1f}"},
+                {'component': 'td', 'text': f"{stats['p99'] * 1000:.1f}"},
+                {'component': 'td', 'text': f"{stats['max'] * 1000:.1f}"}
+            ]
+        } for stage, stats in sorted(snapshot["stages"].items())]
+        
+        return [
+            {
+                'component': 'VRow',
+                'content': cards
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VTable',
+                                'props': {
+                                    'hover': True,
+                                    'density': 'compact'
+                                },
+                                'content': [
+                                    {
+                                        'component': 'thead',
+                                        'content': [
+                                            {
+                                                'component': 'tr',
+                                                'content': [
+                                                    {'component': 'th', 'text': title}
+                                                    for title in ('qBittorrent', '状态', '连续失败', '试探时间', '并发(进行中/限制)')
+                                                ]
+                                            }
+                                        ]
+                                    },
+                                    {
+                                        'component': 'tbody',
+                                        'content': instances or [
+                                            {
+                                                'component': 'tr',
+                                                'content': [
+                                                    {'component': 'td', 'props': {'colspan': 5}, 'text': '未配置qBittorrent'}
+                                                ]
+                                            }
+                                        ]
+                                    }
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            },
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VTable',
+                                'props': {
+                                    'hover': True,
+                                    'density': 'compact'
+                                },
+                                'content': [
+                                    {
+                                        'component': 'thead',
+                                        'content': [
+                                            {
+                                                'component': 'tr',
+                                                'content': [
+                                                    {'component': 'th', 'text': title}
+                                                    for title in ('阶段', '次数', '平均(ms)', 'p50(ms)', 'p99(ms)', '最大(ms)')
+                                                ]
+                                            }
+                                        ]
+                                    },
+                                    {
+                                        'component': 'tbody',
+                                        'content': rows or [
+                                            {
+                                                'component': 'tr',
+                                                'content': [
+                                                    {'component': 'td', 'props': {'colspan': 6}, 'text': '暂无数据'}
+                                                ]
+                                            }
+                                        ]
+                                    }
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
 
     def get_state(self) -> bool:
         """
@@ -243,15 +1372,56 @@ class EmbyQbCleaner(_PluginBase):
         """
         退出插件
         """
-        pass
+        # 先处理完队列中的任务，再保存索引、关闭会话
+        if self._worker_pool:
+            self._worker_pool.stop()
+            self._worker_pool = None
+        if self._batcher:
+            self._batcher.stop()
+            self._batcher = None
+        for downloader in self._downloaders:
+            self._persist_index(downloader, force=True)
+            downloader.close()
+        self._downloaders = []
+        self._save_deferred()
+        if self._notifier:
+            self._notifier.stop()
+            self._notifier = None
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if self._emby_session:
+            self._emby_session.close()
+            self._emby_session = None
+        if self._notify_session:
+            self._notify_session.close()
+            self._notify_session = None
+
+    # 获取目标媒体库的目录前缀树，媒体库列表刷新或目标变化时重新构建
+    def get_library_matcher(self) -> Optional[PathPrefixTrie]:
+        libraries = self.get_libraries()
+        targets = tuple(self._target_libraries)
+        source = self._library_matcher_source
+        if not source or source[0] is not libraries or source[1] != targets:
+            self._library_matcher = PathPrefixTrie.from_libraries(libraries, self._target_libraries)
+            self._library_matcher_source = (libraries, targets)
+            logger.info(f"已构建目标媒体库目录索引，共 {len(self._library_matcher)} 个目录")
+        return self._library_matcher if len(self._library_matcher) else None
 
     # 检查媒体项是否属于指定的媒体库
     def is_in_target_library(self, item_data):
-        # 尝试从不同位置获取媒体库名称
-        library_name = None
-        
-        # 尝试从嵌套字典中获取库名
+        if not self._target_libraries:
+            return True
         item = item_data.get("Item", {})
+        path = item.get("Path", "")
+        
+        # 按媒体库物理目录做前缀匹配
+        matcher = self.get_library_matcher()
+        if matcher:
+            return matcher.match(path) is not None
+        
+        # 无法获取媒体库目录时，按媒体库名称或路径匹配
+        library_name = None
         if "CollectionType" in item:
             library_name = item.get("Name")
         elif "LibraryName" in item:
@@ -259,23 +1429,39 @@ class EmbyQbCleaner(_PluginBase):
         elif "library" in item and isinstance(item["library"], dict):
             library_name = item["library"].get("Name")
         
-        # 如果未找到库名，尝试从路径推断
-        if not library_name:
-            path = item.get("Path", "")
-            if self._target_library.lower() in path.lower():
+        for target in self._target_libraries:
+            target = str(target).lower()
+            if library_name and target in library_name.lower():
+                return True
+            if target in path.lower():
                 return True
-        
-        # 如果找到库名，检查是否匹配目标库
-        if library_name:
-            return self._target_library.lower() in library_name.lower()
         
         # 默认不匹配
         return False
 
-    # 获取Emby API令牌
+    # 获取复用的HTTP会话，首次使用时创建
+    def _http_session(self, attr: str):
+        session = getattr(self, attr)
+        if session is None:
+            with self._session_lock:
+                session = getattr(self, attr)
+                if session is None:
+                    import requests
+                    session = requests.Session()
+                    setattr(self, attr, session)
+        return session
+
+    # 获取Emby API令牌，认证结果缓存复用
     def get_emby_token(self):
         if self._emby_api_key:
             return self._emby_api_key
+        token = self._emby_cache.get("token")
+        if token:
+            self._metrics.inc("cache_requests", cache="emby_token", result="hit")
+            return token
+        self._metrics.inc("cache_requests", cache="emby_token", result="miss")
+        if not self._emby_host or not self._emby_username:
+            return None
             
         url = f"{self._emby_host}/emby/Users/AuthenticateByName"
         headers = {
@@ -288,142 +1474,884 @@ class EmbyQbCleaner(_PluginBase):
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data)
+            self._metrics.inc("http_requests", target="emby", method="AuthenticateByName")
+            with self._metrics.timer("emby_token"):
+                response = self._http_session("_emby_session").post(url, headers=headers, json=data, timeout=30)
             response.raise_for_status()
-            return response.json().get("AccessToken")
+            token = response.json().get("AccessToken")
+            if token:
+                self._emby_cache.set("token", token, ttl=self._emby_token_ttl)
+            return token
         except Exception as e:
             logger.error(f"获取Emby令牌失败: {str(e)}")
             return None
 
-    # 连接到qBittorrent
-    def get_qb_client(self):
+    # 调用Emby API，令牌失效（401）时清空缓存并重新认证一次
+    def emby_request(self, method: str, path: str, **kwargs):
+        if not self._emby_host:
+            return None
+        for retry in range(2):
+            token = self.get_emby_token()
+            if not token:
+                return None
+            try:
+                self._metrics.inc("http_requests", target="emby", method=path.split("?", 1)[0])
+                response = self._http_session("_emby_session").request(method, f"{self._emby_host}{path}",
+                                                                       headers={"X-Emby-Token": token},
+                                                                       timeout=30, **kwargs)
+                if response.status_code == 401:
+                    logger.warning("Emby令牌已失效，清空缓存")
+                    self._emby_cache.clear()
+                    # 封面地址中带有令牌，一并失效
+                    self._image_cache.clear()
+                    if not retry and not self._emby_api_key:
+                        continue
+                response.raise_for_status()
+                return response.json() if response.content else None
+            except Exception as e:
+                logger.error(f"请求Emby接口失败 {path}: {str(e)}")
+                return None
+        return None
+
+    # 获取Emby媒体库列表，结果缓存一段时间
+    def get_libraries(self) -> List[dict]:
+        libraries = self._emby_cache.get("libraries")
+        if libraries is not None:
+            self._metrics.inc("cache_requests", cache="libraries", result="hit")
+            return libraries
+        self._metrics.inc("cache_requests", cache="libraries", result="miss")
+        libraries = None
+        if self._emby_host:
+            folders = self.emby_request("GET", "/emby/Library/VirtualFolders")
+            if folders is not None:
+                libraries = [{
+                    "Name": folder.get("Name"),
+                    "Id": folder.get("ItemId"),
+                    "Locations": folder.get("Locations") or []
+                } for folder in folders]
+        else:
+            try:
+                # 未配置Emby地址时，使用MoviePilot的Emby模块获取媒体库列表
+                if not self._emby:
+                    from app.modules.emby import Emby
+                    self._emby = Emby()
+                libraries = self._emby.get_library_list()
+            except Exception as e:
+                logger.error(f"获取媒体库列表失败: {str(e)}")
+        if libraries is None:
+            return []
+        self._emby_cache.set("libraries", libraries, ttl=self._library_ttl)
+        return libraries
+
+    # 获取媒体项封面图片URL
+    def get_image_url(self, item_id) -> Optional[str]:
+        if not item_id or not self._emby_host:
+            return None
+        cache_key = f"image:{item_id}"
+        image_url = self._image_cache.get(cache_key)
+        if image_url:
+            self._metrics.inc("cache_requests", cache="image_url", result="hit")
+            return image_url
+        self._metrics.inc("cache_requests", cache="image_url", result="miss")
+        token = self.get_emby_token()
+        if not token:
+            return None
+        image_url = f"{self._emby_host}/emby/Items/{item_id}/Images/Primary?api_key={token}"
+        self._image_cache.set(cache_key, image_url)
+        return image_url
+
+    # 获取复用的qBittorrent会话，未指定实例时使用第一个实例
+    def get_qb_client(self, downloader: Optional[Downloader] = None):
+        downloader = downloader or self.get_downloader()
+        if not downloader:
+            logger.error("未配置qBittorrent地址")
+            return None
+        return downloader.client()
+
+    # 按名称获取qBittorrent实例
+    def get_downloader(self, name: Optional[str] = None) -> Optional[Downloader]:
+        for downloader in self._downloaders:
+            if name is None or downloader.name == name:
+                return downloader
+        return None
+
+    # 加载种子文件索引，未加载到时由首次同步全量构建
+    def ensure_index(self, downloader: Downloader):
+        if downloader.loaded:
+            return
+        with downloader.load_lock:
+            if downloader.loaded:
+                return
+            if downloader.index.load(self.get_data(downloader.data_key)):
+                logger.info(f"已加载种子索引 [{downloader.name}]，共 {len(downloader.index)} 个种子")
+            else:
+                logger.info(f"未找到种子索引 [{downloader.name}]，将全量构建")
+            downloader.loaded = True
+
+    # 持久化种子文件索引
+    def _persist_index(self, downloader: Downloader, force=False):
+        if not downloader.loaded or not downloader.index.dirty:
+            return
+        if not force and time.time() - downloader.saved_at < self._index_save_interval:
+            return
+        try:
+            self.save_data(downloader.data_key, downloader.index.to_dict())
+            downloader.index.dirty = False
+            downloader.saved_at = time.time()
+        except Exception as e:
+            logger.error(f"保存种子索引失败 [{downloader.name}]: {str(e)}")
+
+    def _lookup_history(self, file_path) -> Optional[str]:
+        with self._metrics.timer("history_lookup"):
+            return self.get_history_hash(file_path)
+
+    # 从MoviePilot整理历史中查找媒体文件对应的下载种子hash
+    def get_history_hash(self, file_path) -> Optional[str]:
+        dest = self._map_path(file_path, self._path_mappings)
         try:
-            qb = qbittorrentapi.Client(
-                host=self._qb_host,
-                username=self._qb_username,
-                password=self._qb_password
-            )
-            qb.auth_log_in()
-            return qb
+            if not self._transferhis:
+                from app.db.transferhistory_oper import TransferHistoryOper
+                self._transferhis = TransferHistoryOper()
+            history = self._transferhis.get_by_dest(dest)
         except Exception as e:
-            logger.error(f"连接qBittorrent失败: {e}")
+            logger.error(f"查询整理历史失败: {str(e)}")
+            return None
+        if not history or not history.download_hash:
             return None
+        return history.download_hash.lower()
 
-    # 根据媒体文件路径查找并删除种子
-    def delete_torrent_by_file(self, file_path):
-        logger.info(f"开始连接qBittorrent")
-        qb = self.get_qb_client()
+    # 整理种子信息用于通知
+    @staticmethod
+    def build_torrent_info(torrent: dict):
+        tags = torrent.get("tags")
+        return {
+            "name": torrent.get("name"),
+            "added_on": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(torrent.get("added_on") or 0)),
+            "uploaded": round((torrent.get("uploaded") or 0) / (1024**3), 2),  # 转换为GB
+            "tracker": torrent.get("tracker"),
+            "tags": tags.split(', ') if tags else []
+        }
+
+    # 同步单个实例并查找种子，返回 (种子hash, 是否可信)
+    def _search_downloader(self, downloader: Downloader, file_path, file_size,
+                           history_hash: Optional[str], item_key: Optional[FileKey]) -> Tuple[Optional[str], bool]:
+        qb = self._refresh_downloader(downloader)
+        try:
+            return self._lookup_downloader(qb, downloader, file_path, file_size, history_hash, item_key)
+        finally:
+            self._persist_index(downloader)
+
+    # 同步单个实例的种子列表，已删除的种子会被立即移出索引，返回实例的会话
+    def _refresh_downloader(self, downloader: Downloader):
+        qb = self.get_qb_client(downloader)
         if not qb:
-            logger.error("连接qBittorrent失败")
-            return False, "连接qBittorrent失败"
+            raise RuntimeError(f"连接qBittorrent失败 [{downloader.name}]")
+        self.ensure_index(downloader)
+        start = time.perf_counter()
+        with self._metrics.timer("qb_sync"):
+            downloader.index.refresh(qb)
+        logger.info(f"同步种子列表完成 [{downloader.name}]，耗时 {time.perf_counter() - start:.2f} 秒")
+        return qb
+
+    # 在已同步的实例索引中查找种子，依次按整理历史、硬链接、文件名、发布名称相似度匹配
+    def _lookup_downloader(self, qb, downloader: Downloader, file_path, file_size,
+                           history_hash: Optional[str], item_key: Optional[FileKey]) -> Tuple[Optional[str], bool]:
+        if history_hash and downloader.index.in_scope(history_hash):
+            logger.info(f"通过整理历史找到种子 [{downloader.name}]: {history_hash}")
+            self._metrics.inc("lookups", source="history", result="hit")
+            return history_hash, True
+        if item_key:
+            with self._metrics.timer("inode_lookup"):
+                torrent_hash = self._match_inode_hash(downloader, item_key)
+            self._metrics.inc("lookups", source="inode", result="hit" if torrent_hash else "miss")
+            if torrent_hash:
+                logger.info(f"通过硬链接找到种子 [{downloader.name}]: {torrent_hash}")
+                return torrent_hash, True
+        with self._metrics.timer("index_lookup"):
+            torrent_hash, confident = downloader.index.match(file_path, size=file_size)
+        self._metrics.inc("lookups", source="index", result="hit" if torrent_hash else "miss")
+        if torrent_hash:
+            return torrent_hash, confident
+        with self._metrics.timer("release_lookup"):
+            torrent_hash, confident = downloader.index.match_release(qb, file_path, size=file_size)
+        self._metrics.inc("lookups", source="release", result="hit" if torrent_hash else "miss")
+        if torrent_hash:
+            logger.info(f"通过发布名称找到种子 [{downloader.name}]: {torrent_hash}")
+        return torrent_hash, confident
+
+    # 种子数据在MoviePilot中的路径
+    # 未创建子文件夹的多文件种子，内容路径即保存路径，无法确定文件范围，不做索引
+    def _torrent_local_paths(self, downloader: Downloader) -> Dict[str, str]:
+        paths = {}
+        for torrent_hash, torrent in list(downloader.index.torrents.items()):
+            content_path = (torrent.get("content_path") or "").rstrip("/\\")
+            if not content_path or content_path == (torrent.get("save_path") or "").rstrip("/\\") \
+                    or not downloader.index.in_scope(torrent_hash):
+                continue
+            paths[torrent_hash] = self._map_path(content_path, self._download_path_mappings)
+        return paths
+
+    # 通过媒体文件的inode查找硬链接的种子文件，种子列表变化时增量同步，未命中时按目录修改时间校验后重试
+    def _match_inode_hash(self, downloader: Downloader, item_key: FileKey) -> Optional[str]:
+        generation = downloader.index.generation
+        if downloader.inodes_generation != generation:
+            downloader.inodes.sync(self._torrent_local_paths(downloader))
+            downloader.inodes_generation = generation
+        torrent_hash = downloader.inodes.lookup(item_key)
+        if not torrent_hash and downloader.inodes.revalidate():
+            torrent_hash = downloader.inodes.lookup(item_key)
+        if torrent_hash and downloader.index.in_scope(torrent_hash):
+            return torrent_hash
+        return None
+
+    # 根据媒体文件路径查找种子，返回所在实例、种子hash和失败原因
+    def find_torrent(self, file_path, file_size=None, history_hash: Optional[str] = None,
+                     history_checked: bool = False) -> Tuple[Optional[Downloader], Optional[str], str]:
+        if not self._downloaders:
+            logger.error("未配置qBittorrent地址")
+            return None, None, "未配置qBittorrent地址"
+        
+        # 从路径中提取文件名
+        filename = os.path.basename(file_path)
+        
+        # 优先通过整理历史直接定位种子，未命中时再按文件名查找；调用方已查询过（包括未命中）时不再重复查询
+        if not history_checked:
+            history_hash = self._lookup_history(file_path)
+        # 硬链接匹配：读取媒体文件的inode，各实例中查找
+        item_key = file_key(self._map_path(file_path, self._path_mappings)) if self._match_inode else None
+        logger.info(f"查找包含文件的种子: {filename}")
         
+        # 各实例并行同步和查找，第一个可信的结果直接采用，其余按实例顺序取第一个候选
+        candidates: Dict[str, str] = {}
+        errors = []
+        executor = ThreadPoolExecutor(max_workers=len(self._downloaders))
         try:
-            # 获取所有种子
-            torrents = qb.torrents_info()
-            logger.info(f"当前共有 {len(torrents)} 个种子")
-            
-            # 从路径中提取文件名
-            filename = os.path.basename(file_path)
-            logger.info(f"查找包含文件的种子: {filename}")
-            
-            for torrent in torrents:
-                # 先检查种子名称是否匹配
-                if filename.lower() in torrent.name.lower():
-                    logger.info(f"找到匹配的种子: {torrent.name}")
-                    
-                    # 获取种子详细信息
-                    torrent_info = {
-                        "name": torrent.name,
-                        "added_on": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(torrent.added_on)),
-                        "uploaded": round(torrent.uploaded / (1024**3), 2),  # 转换为GB
-                        "tracker": torrent.tracker,
-                        "tags": torrent.tags.split(', ') if torrent.tags else []
-                    }
-                    
-                    try:
-                        # 删除种子及其数据
-                        qb.torrents_delete(delete_files=self._delete_files, hashes=torrent.hash)
-                        logger.info(f"成功删除种子: {torrent.name}")
-                        return True, torrent_info
-                    except Exception as e:
-                        logger.error(f"删除种子时出错: {str(e)}")
-                        return False, f"删除种子失败: {str(e)}"
-                
-                # 如果名称不匹配，尝试检查文件列表
+            futures = {executor.submit(self._search_downloader, downloader, file_path, file_size,
+                                       history_hash, item_key):
+                       downloader for downloader in self._downloaders}
+            for future in as_completed(futures):
+                downloader = futures[future]
                 try:
-                    torrent_files = qb.torrents_files(torrent.hash)
-                    for torrent_file in torrent_files:
-                        torrent_filename = os.path.basename(torrent_file.name)
-                        if filename.lower() == torrent_filename.lower():
-                            logger.info(f"找到完全匹配的种子: {torrent.name}")
-                            
-                            # 获取种子详细信息
-                            torrent_info = {
-                                "name": torrent.name,
-                                "added_on": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(torrent.added_on)),
-                                "uploaded": round(torrent.uploaded / (1024**3), 2),  # 转换为GB
-                                "tracker": torrent.tracker,
-                                "tags": torrent.tags.split(', ') if torrent.tags else []
-                            }
-                            
-                            try:
-                                # 删除种子及其数据
-                                qb.torrents_delete(delete_files=self._delete_files, hashes=torrent.hash)
-                                logger.info(f"成功删除种子: {torrent.name}")
-                                return True, torrent_info
-                            except Exception as e:
-                                logger.error(f"删除种子时出错: {str(e)}")
-                                return False, f"删除种子失败: {str(e)}"
+                    torrent_hash, confident = future.result()
                 except Exception as e:
+                    logger.error(f"查找种子时出错 [{downloader.name}]: {str(e)}")
+                    errors.append(str(e))
                     continue
-            
-            logger.warning(f"未找到匹配的种子: {filename}")
-            return False, "未找到匹配的种子"
+                if torrent_hash and confident:
+                    return self._found_torrent(downloader, torrent_hash)
+                if torrent_hash:
+                    candidates[downloader.name] = torrent_hash
+        finally:
+            # 不等待较慢的实例，其同步结果仍会更新各自的索引
+            executor.shutdown(wait=False)
+        
+        for downloader in self._downloaders:
+            if downloader.name in candidates:
+                return self._found_torrent(downloader, candidates[downloader.name])
+        if history_hash:
+            logger.info(f"整理历史中的种子已不在qBittorrent中或不在清理范围内: {history_hash}")
+        if len(errors) == len(self._downloaders):
+            return None, None, f"错误: {errors[0]}"
+        logger.warning(f"未找到匹配的种子: {filename}")
+        return None, None, "未找到匹配的种子"
+
+    @staticmethod
+    def _found_torrent(downloader: Downloader, torrent_hash: str) -> Tuple[Downloader, str, str]:
+        logger.info(f"找到匹配的种子 [{downloader.name}]: "
+                    f"{(downloader.index.torrents.get(torrent_hash) or {}).get('name')}")
+        return downloader, torrent_hash, ""
+
+    # 一次请求删除同一实例中的多个种子
+    def delete_torrents(self, downloader: Downloader, hashes: List[str]) -> Tuple[bool, str]:
+        qb = self.get_qb_client(downloader)
+        if not qb:
+            return False, "连接qBittorrent失败"
+        try:
+            # 删除种子及其数据，种子较多时分批请求
+            for i in range(0, len(hashes), self._delete_chunk_size):
+                qb.torrents_delete(delete_files=self._delete_files,
+                                   torrent_hashes=hashes[i:i + self._delete_chunk_size])
+        except Exception as e:
+            logger.error(f"删除种子时出错 [{downloader.name}]: {str(e)}")
+            return False, f"删除种子失败: {str(e)}"
+        with self._dedup_lock:
+            for torrent_hash in hashes:
+                self._pack_progress.pop((downloader.name, torrent_hash), None)
+        for torrent_hash in hashes:
+            downloader.index.remove(torrent_hash)
+        self._persist_index(downloader)
+        return True, ""
+
+    # 根据媒体文件路径查找并删除种子
+    def delete_torrent_by_file(self, file_path, file_size=None):
+        downloader, torrent_hash, error = self.find_torrent(file_path, file_size)
+        if not torrent_hash:
+            return False, error
+        torrent_info = self.build_torrent_info(downloader.index.torrents.get(torrent_hash) or {})
+        success, error = self.delete_torrents(downloader, [torrent_hash])
+        if not success:
+            return False, error
+        logger.info(f"成功删除种子: {torrent_info['name']}")
+        return True, torrent_info
+
+    # 记录季包的播放进度，返回尚未播放的正片数量
+    def _pack_remaining(self, downloader: Downloader, torrent_hash, item_key) -> int:
+        if not self._wait_season_pack:
+            return 0
+        # 文件列表按需获取，通过整理历史或硬链接找到的种子可能尚未获取
+        if torrent_hash not in downloader.index.files:
+            qb = self.get_qb_client(downloader)
+            if qb:
+                downloader.index.fetch_files(qb, [torrent_hash])
+        media_files = downloader.index.media_files(torrent_hash)
+        if len(media_files) <= 1:
+            return 0
+        key = (downloader.name, torrent_hash)
+        with self._dedup_lock:
+            # 清理已不存在的实例和种子的记录
+            for name, h in list(self._pack_progress):
+                owner = self.get_downloader(name)
+                if not owner or h not in owner.index:
+                    self._pack_progress.pop((name, h), None)
+            played = set(self._pack_progress.get(key) or [])
+            played.add(item_key)
+            self._pack_progress[key] = sorted(played)
+            progress = [[name, h, keys] for (name, h), keys in self._pack_progress.items()]
+        try:
+            self.save_data("pack_progress", progress)
+        except Exception as e:
+            logger.error(f"保存季包播放进度失败: {str(e)}")
+        return max(0, len(media_files) - len(played))
+
+    # 读取保存的季包播放进度，旧版本按hash保存的记录归入第一个实例（当时只支持一个实例）
+    def _load_pack_progress(self, data) -> Dict[Tuple[str, str], List[str]]:
+        if isinstance(data, dict):
+            downloader = self.get_downloader()
+            return {(downloader.name, h): keys for h, keys in data.items()} if downloader else {}
+        return {(name, h): keys for name, h, keys in data or []}
+
+    # 批量删除窗口结束时，合并删除并发送一条汇总通知
+    def _flush_deletions(self, entries: List[dict], check_seeding: bool = True) -> bool:
+        # 按实例分组，同一种子只删除一次，返回是否没有删除失败的条目
+        groups: Dict[str, List[dict]] = {}
+        for entry in entries:
+            groups.setdefault(entry["downloader"], []).append(entry)
+        deleted, deleted_keys, failed, errors = [], [], [], []
+        for name, group in groups.items():
+            downloader = self.get_downloader(name)
+            if downloader and check_seeding and (self._min_seed_hours or self._min_ratio):
+                group = self._defer_unseeded(downloader, group)
+                if not group:
+                    continue
+            hashes = list(dict.fromkeys(entry["hash"] for entry in group))
+            logger.info(f"批量删除 {len(hashes)} 个种子 [{name}]，涉及 {len(group)} 个媒体项")
+            # 季包中先前播放的媒体项随种子一起完成
+            item_keys = [self._item_key(entry["item_data"]) for entry in group]
+            with self._dedup_lock:
+                item_keys += [k for h in hashes for k in self._pack_progress.get((name, h)) or []]
+            success, error = self.delete_torrents(downloader, hashes) if downloader \
+                else (False, f"qBittorrent实例已移除: {name}")
+            if success:
+                names = list(dict.fromkeys(entry['torrent']['name'] or '' for entry in group))
+                logger.info(f"成功删除种子: {', '.join(names[:10])}" + (f" 等{len(names)}个" if len(names) > 10 else ""))
+                self._journal.set_state(item_keys, CleanupJournal.DELETED)
+                deleted.extend(group)
+                deleted_keys.extend(item_keys)
+            elif downloader and not downloader.healthy:
+                # 实例不可用时保留任务记录，恢复后重新删除
+                logger.warning(f"qBittorrent [{name}] 不可用，暂存 {len(group)} 个待删除条目: {error}")
+                with self._dedup_lock:
+                    self._parked_deletions.extend(group)
+                self._metrics.inc("parked", len(group), kind="deletion")
+            else:
+                # 删除失败的任务不保留记录，之后的事件重新处理
+                for entry in group:
+                    self._journal.remove(self._item_key(entry["item_data"]))
+                failed.extend(group)
+                errors.append(error)
+        if deleted:
+            self.send_cleanup_notification(deleted, True)
+            self._journal.set_state(deleted_keys, CleanupJournal.NOTIFIED)
+        if failed:
+            self.send_cleanup_notification(failed, False, "；".join(errors))
+        return not failed
+
+    # qBittorrent实例不可用时暂存媒体项，返回是否已暂存
+    def _park_item(self, item_data: dict, reason: str = "") -> bool:
+        item_key = self._item_key(item_data)
+        if not item_key or all(d.healthy for d in self._downloaders):
+            return False
+        with self._dedup_lock:
+            self._parked[item_key] = item_data
+        logger.warning(f"qBittorrent不可用，暂存媒体项待恢复后重试: {item_key}" + (f"（{reason}）" if reason else ""))
+        self._metrics.inc("parked", kind="item")
+        return True
+
+    # 重新处理暂存的任务：仍在冷却时跳过，熔断器试探期间只放行一个媒体项
+    def retry_parked(self):
+        if not self._enabled or not self._worker_pool or not (self._parked or self._parked_deletions):
+            return
+        if not all(d.session.available for d in self._downloaders):
+            return
+        healthy = all(d.healthy for d in self._downloaders)
+        with self._dedup_lock:
+            keys = list(self._parked)[:None if healthy else 1]
+            items = [(k, self._parked.pop(k)) for k in keys]
+            deletions, self._parked_deletions = (self._parked_deletions, []) if healthy \
+                else ([], self._parked_deletions)
+            for item_key, _ in items:
+                self._inflight_items.add(item_key)
+        if items or deletions:
+            logger.info(f"重试暂存的任务：{len(items)} 个媒体项，{len(deletions)} 个待删除条目")
+        for item_key, item_data in items:
+            if not self._worker_pool.submit(item_data):
+                with self._dedup_lock:
+                    self._inflight_items.discard(item_key)
+                    self._parked[item_key] = item_data
+        for entry in deletions:
+            self._batcher.add(entry)
+
+    # 距离满足做种要求还需等待的秒数，0表示可以删除
+    def _seeding_wait(self, torrent: dict) -> float:
+        tracker = torrent.get("tracker") or ""
+        tags = {t.strip() for t in (torrent.get("tags") or "").split(",")}
+        if any(keyword in tracker or keyword in tags for keyword in self._defer_exclude):
+            return 0
+        waits = []
+        if self._min_seed_hours:
+            remaining = self._min_seed_hours * 3600 - (torrent.get("seeding_time") or 0)
+            if remaining <= 0:
+                return 0
+            waits.append(remaining)
+        if self._min_ratio:
+            if (torrent.get("ratio") or 0) >= self._min_ratio:
+                return 0
+            waits.append(self._defer_recheck)
+        # 至少间隔一分钟再检查
+        return max(60, min(waits)) if waits else 0
+
+    # 一次请求检查同一实例中种子的做种情况，未达标的推迟删除，返回可以立即删除的条目
+    def _defer_unseeded(self, downloader: Downloader, entries: List[dict]) -> List[dict]:
+        hashes = list(dict.fromkeys(entry["hash"] for entry in entries))
+        torrents = None
+        qb = self.get_qb_client(downloader)
+        if qb:
+            try:
+                torrents = {t["hash"]: t for t in qb.torrents_info(torrent_hashes=hashes)}
+            except Exception as e:
+                logger.error(f"获取种子做种信息失败 [{downloader.name}]: {str(e)}")
+        now = time.time()
+        ready = []
+        for torrent_hash in hashes:
+            group = [entry for entry in entries if entry["hash"] == torrent_hash]
+            torrent = torrents.get(torrent_hash) if torrents is not None else None
+            # 获取失败时稍后重试，种子已不存在时照常处理
+            if torrents is None:
+                wait = self._defer_recheck
+            else:
+                wait = self._seeding_wait(torrent) if torrent else 0
+            if not wait:
+                ready.extend(group)
+                continue
+            self._deferred.add((downloader.name, torrent_hash),
+                               [self._item_key(entry["item_data"]) for entry in group], now + wait)
+            logger.info(f"种子 {group[0]['torrent']['name']} 未达到做种要求，"
+                        f"推迟至 {time.strftime('%Y-%m-%d %H:%M', time.localtime(now + wait))} 再检查")
+        self._save_deferred()
+        return ready
+
+    # 保存推迟删除的种子
+    def _save_deferred(self):
+        if self._deferred is None or not self._deferred.dirty:
+            return
+        try:
+            self.save_data("deferred_deletions", self._deferred.to_list())
+            self._deferred.dirty = False
+        except Exception as e:
+            logger.error(f"保存推迟删除记录失败: {str(e)}")
+
+    # 定时检查已到期的推迟删除种子，每个实例一次请求获取全部到期种子的做种信息
+    def check_deferred(self):
+        if not self._enabled or self._deferred is None:
+            return
+        now = time.time()
+        due = self._deferred.pop_due(now, self._defer_tick_limit)
+        if not due:
+            return
+        groups: Dict[str, List[Tuple[str, List[str]]]] = {}
+        for (name, torrent_hash), item_keys in due:
+            groups.setdefault(name, []).append((torrent_hash, item_keys))
+        entries = []
+        for name, jobs in groups.items():
+            downloader = self.get_downloader(name)
+            if not downloader:
+                # 实例已移除，不保留记录，之后的事件重新处理
+                logger.warning(f"qBittorrent实例已移除，放弃推迟删除的 {len(jobs)} 个种子: {name}")
+                for _, item_keys in jobs:
+                    for item_key in item_keys:
+                        self._journal.remove(item_key)
+                continue
+            torrents = None
+            qb = self.get_qb_client(downloader)
+            if qb:
+                try:
+                    torrents = {t["hash"]: t for t in qb.torrents_info(torrent_hashes=[h for h, _ in jobs])}
+                except Exception as e:
+                    logger.error(f"获取种子做种信息失败 [{name}]: {str(e)}")
+            for torrent_hash, item_keys in jobs:
+                if torrents is None:
+                    self._deferred.add((name, torrent_hash), item_keys, now + self._defer_recheck)
+                    continue
+                torrent = torrents.get(torrent_hash)
+                if not torrent:
+                    logger.info(f"推迟删除的种子已不在qBittorrent中: {torrent_hash}")
+                    self._journal.set_state(item_keys, CleanupJournal.NOTIFIED)
+                    continue
+                wait = self._seeding_wait(torrent)
+                if wait:
+                    self._deferred.add((name, torrent_hash), item_keys, now + wait)
+                    continue
+                entries.extend(self._deferred_entries(name, torrent_hash, item_keys, torrent))
+        self._save_deferred()
+        if entries:
+            logger.info(f"{len(entries)} 个媒体项的种子已达到做种要求，开始删除")
+            self._flush_deletions(entries, check_seeding=False)
+
+    # 由任务日志还原推迟删除的条目
+    def _deferred_entries(self, name: str, torrent_hash: str, item_keys: List[str], torrent: dict) -> List[dict]:
+        entries = []
+        for item_key in item_keys:
+            job = self._journal.get(item_key)
+            if job and job["entry"]:
+                entries.append(dict(job["entry"], item_data=job["item_data"]))
+        if not entries:
+            entries.append({
+                "downloader": name,
+                "hash": torrent_hash,
+                "item_data": {},
+                "item_name": torrent.get("name"),
+                "item_type": "未知",
+                "image_url": None,
+                "torrent": self.build_torrent_info(torrent),
+                "size": torrent.get("size") or 0
+            })
+        return entries
+
+    # 定期核对Emby中已播放的媒体项，清理Webhook丢失时遗漏的种子
+    def sweep_played_items(self):
+        if not self._enabled or not self._emby_host:
+            logger.warning("插件未启用或未配置Emby地址，跳过已播放媒体项核对")
+            return
+        if not self._sweep_lock.acquire(blocking=False):
+            logger.info("已播放媒体项核对正在运行，跳过本次")
+            return
+        try:
+            start = time.perf_counter()
+            with self._metrics.timer("sweep"):
+                count = self._sweep()
+            logger.info(f"已播放媒体项核对完成，清理 {count} 个媒体项，耗时 {time.perf_counter() - start:.2f} 秒")
         except Exception as e:
-            logger.error(f"删除种子时出错: {str(e)}")
-            return False, f"错误: {str(e)}"
+            logger.error(f"已播放媒体项核对出错: {str(e)}")
+        finally:
+            self._sweep_lock.release()
+
+    # 核对的媒体库ID，未指定目标媒体库时为全部
+    def _sweep_parents(self) -> List[Optional[str]]:
+        if not self._target_libraries:
+            return [None]
+        return [library.get("Id") for library in self.get_libraries()
+                if library.get("Id") in self._target_libraries or library.get("Name") in self._target_libraries]
+
+    # 按最后播放时间倒序分页获取已播放的媒体项，遇到不晚于水位的媒体项即停止
+    def _fetch_played_items(self, user_id: str, parent_id: Optional[str],
+                            watermark: Optional[str]) -> Tuple[List[dict], Optional[str]]:
+        items, latest, start_index = [], None, 0
+        while True:
+            params = {
+                "Recursive": "true",
+                "IsPlayed": "true",
+                "IncludeItemTypes": "Movie,Episode",
+                "Fields": "Path,MediaSources",
+                "SortBy": "DatePlayed",
+                "SortOrder": "Descending",
+                "EnableImages": "false",
+                "StartIndex": start_index,
+                "Limit": self._sweep_page_size
+            }
+            if parent_id:
+                params["ParentId"] = parent_id
+            data = self.emby_request("GET", f"/emby/Users/{user_id}/Items", params=params)
+            if data is None:
+                # 获取失败时不更新水位，下次重新核对
+                return items, None
+            page = data.get("Items") or []
+            for item in page:
+                played_at = (item.get("UserData") or {}).get("LastPlayedDate") or ""
+                if watermark and played_at <= watermark:
+                    return items, latest or watermark
+                latest = max(latest or "", played_at) or None
+                items.append(item)
+            start_index += len(page)
+            if len(page) < self._sweep_page_size:
+                return items, latest or watermark
+
+    def _sweep(self) -> int:
+        users = self.emby_request("GET", "/emby/Users", params={"IsDisabled": "false"})
+        if not users:
+            logger.warning("获取Emby用户列表失败，跳过核对")
+            return 0
+        
+        # 增量获取各用户在目标媒体库中新播放的媒体项
+        parents = self._sweep_parents()
+        if not parents:
+            logger.warning("未找到目标媒体库，跳过核对")
+            return 0
+        watermarks = dict(self.get_data("sweep_watermarks") or {})
+        items: Dict[str, dict] = {}
+        for user in users:
+            for parent_id in parents:
+                key = f"{user.get('Id')}:{parent_id or ''}"
+                played, latest = self._fetch_played_items(user.get("Id"), parent_id, watermarks.get(key))
+                for item in played:
+                    items.setdefault(str(item.get("Id")), item)
+                if latest:
+                    watermarks[key] = latest
+        # 已有任务记录的媒体项无需再处理
+        items = {k: item for k, item in items.items() if item.get("Path") and not self._journal.get(k)}
+        logger.info(f"新播放的媒体项 {len(items)} 个")
+        
+        entries = []
+        # 未配置实例或有实例同步失败时不更新水位，下次重新核对这些媒体项
+        synced = bool(self._downloaders)
+        if items:
+            # 各实例只同步一次种子列表，之后全部在本地索引中匹配
+            downloaders = []
+            for downloader in self._downloaders:
+                try:
+                    downloaders.append((downloader, self._refresh_downloader(downloader)))
+                except Exception as e:
+                    logger.error(f"同步种子列表失败 [{downloader.name}]: {str(e)}")
+                    synced = False
+            for item_key, item in items.items():
+                try:
+                    entry = self._sweep_item(item_key, item, downloaders)
+                except Exception as e:
+                    # 单个媒体项出错不影响其余媒体项，水位保持不变，下次核对重新处理
+                    logger.error(f"核对媒体项出错 {item.get('Path')}: {str(e)}")
+                    synced = False
+                    continue
+                if entry:
+                    entries.append(entry)
+            for downloader, _ in downloaders:
+                self._persist_index(downloader)
+        
+        # 按实例合并为批量删除请求，发送一条汇总通知；删除失败时同样不更新水位
+        if entries and not self._flush_deletions(entries):
+            synced = False
+        if synced:
+            self.save_data("sweep_watermarks", watermarks)
+        else:
+            logger.warning("核对未全部完成，不更新核对水位")
+        return len(entries)
+
+    # 在已同步的实例中匹配核对的媒体项，返回待删除的条目
+    def _sweep_item(self, item_key: str, item: dict, downloaders: List[tuple]) -> Optional[dict]:
+        file_path = item["Path"]
+        file_size = self._get_item_size(item)
+        history_hash = self.get_history_hash(file_path)
+        inode_key = file_key(self._map_path(file_path, self._path_mappings)) if self._match_inode else None
+        match = None
+        for downloader, qb in downloaders:
+            torrent_hash, confident = self._lookup_downloader(qb, downloader, file_path, file_size,
+                                                              history_hash, inode_key)
+            if torrent_hash and (confident or not match):
+                match = (downloader, torrent_hash)
+            if torrent_hash and confident:
+                break
+        if not match:
+            return None
+        downloader, torrent_hash = match
+        item_data = {"Event": "sweep", "Item": item}
+        torrent = downloader.index.torrents.get(torrent_hash) or {}
+        entry = {
+            "downloader": downloader.name,
+            "hash": torrent_hash,
+            "item_data": item_data,
+            "item_name": item.get("Name", "未知"),
+            "item_type": item.get("Type", "未知"),
+            "image_url": None,
+            "torrent": self.build_torrent_info(torrent),
+            "size": torrent.get("size") or 0
+        }
+        if not self._journal.receive(item_key, item_data):
+            return None
+        try:
+            self._journal.update(item_key, CleanupJournal.MATCHED, downloader=downloader.name,
+                                 hash=torrent_hash, entry=self._journal_entry(entry))
+            # 季包在全部正片播放完成后才删除
+            if self._pack_remaining(downloader, torrent_hash, item_key):
+                return None
+        except Exception:
+            # 未加入删除的任务不保留记录，否则之后的核对和Webhook都会跳过该媒体项
+            self._journal.remove(item_key)
+            raise
+        return entry
 
-    # 发送Telegram消息
+    # 发送Telegram消息，被限流时抛出RetryAfter，请求被拒绝（4xx）时抛出DeliveryRejected，
+    # 服务端错误和网络错误抛出其他异常由通知队列重试
     def send_telegram_notification(self, message, image_data=None):
         if not self._telegram_token or not self._telegram_chat_id or not self._send_notification:
             logger.warning("Telegram配置缺失或通知已禁用，跳过通知")
             return False
         
+        if image_data:
+            url = f"https://api.telegram.org/bot{self._telegram_token}/sendPhoto"
+            data = {
+                "chat_id": self._telegram_chat_id,
+                "caption": message,
+                "parse_mode": "HTML"
+            }
+            files = {
+                "photo": ("image.jpg", image_data)
+            }
+        else:
+            url = f"https://api.telegram.org/bot{self._telegram_token}/sendMessage"
+            data = {
+                "chat_id": self._telegram_chat_id,
+                "text": message,
+                "parse_mode": "HTML"
+            }
+            files = None
+        self._metrics.inc("http_requests", target="telegram", method=url.rsplit("/", 1)[-1])
+        response = self._http_session("_notify_session").post(url, data=data, files=files, timeout=30)
+        if response.status_code == 429:
+            try:
+                retry_after = response.json().get("parameters", {}).get("retry_after") or 5
+            except ValueError:
+                retry_after = 5
+            raise RetryAfter(retry_after)
+        if 400 <= response.status_code < 500:
+            try:
+                description = response.json().get("description") or ""
+            except ValueError:
+                description = ""
+            raise DeliveryRejected(f"Telegram返回 {response.status_code} {description}".strip())
+        response.raise_for_status()
+        logger.info("Telegram消息发送成功")
+        return True
+
+    # 发送清理通知，由通知队列在窗口内合并后发送
+    def send_cleanup_notification(self, entries: List[dict], success: bool, detail: str = ""):
+        if not self._send_notification or not entries:
+            return
+        if self._notifier and self._notifier.submit((entries, success, detail)):
+            return
+        # 通知队列未运行时直接发送
+        for message in self._digest_notifications([(entries, success, detail)]):
+            try:
+                self._deliver_notification(message)
+            except Exception as e:
+                logger.error(f"发送通知失败: {str(e)}")
+
+    # 合并窗口内的通知：成功的合并为一条摘要，失败的合并为一条
+    def _digest_notifications(self, batches: List[Tuple[List[dict], bool, str]]) -> List[Tuple[str, str, Any]]:
+        succeeded = [entry for entries, success, _ in batches if success for entry in entries]
+        failed = [entry for entries, success, _ in batches if not success for entry in entries]
+        details = list(dict.fromkeys(detail for _, success, detail in batches if not success and detail))
+        notifications = []
+        if succeeded:
+            notifications.append((self._format_cleanup_notification(succeeded, True), succeeded[0].get("image_url")))
+        if failed:
+            notifications.append((self._format_cleanup_notification(failed, False, "；".join(details)),
+                                  failed[0].get("image_url")))
+        messages = []
+        for text, image_url in notifications:
+            messages.append(("moviepilot", text, image_url))
+            if self._telegram_token and self._telegram_chat_id:
+                messages.append(("telegram", text, None))
+        return messages
+
+    # 按渠道发送一条通知
+    def _deliver_notification(self, message: Tuple[str, str, Any]):
+        channel, text, image_url = message
         try:
-            logger.info("准备发送Telegram消息")
-            if image_data:
-                logger.info("发送带图片的消息")
-                url = f"https://api.telegram.org/bot{self._telegram_token}/sendPhoto"
-                data = {
-                    "chat_id": self._telegram_chat_id,
-                    "caption": message,
-                    "parse_mode": "HTML"
-                }
-                files = {
-                    "photo": ("image.jpg", image_data)
-                }
-                logger.info("发送请求到Telegram API")
-                response = requests.post(url, data=data, files=files)
+            with self._metrics.timer(f"notification_{channel}"):
+                if channel == "telegram":
+                    self.send_telegram_notification(text)
+                else:
+                    # 使用 MoviePilot 的通知系统
+                    self.post_message(
+                        mtype=NotificationType.Plugin,
+                        title="媒体清理通知",
+                        text=html.unescape(text.replace('<b>', '').replace('</b>', '')),
+                        image=image_url  # 使用图片URL而不是二进制数据
+                    )
+        except Exception:
+            self._metrics.inc("notifications", channel=channel, result="failed")
+            raise
+        self._metrics.inc("notifications", channel=channel, result="sent")
+
+    # 通知内容按HTML发送，名称、路径等文本需转义
+    @staticmethod
+    def _escape_html(value) -> str:
+        return html.escape(str(value if value is not None else ""), quote=False)
+
+    # 生成清理通知内容，多个媒体项合并为一条汇总
+    def _format_cleanup_notification(self, entries: List[dict], success: bool, detail: str = "") -> str:
+        esc = self._escape_html
+        notification = f"✅ <b>媒体清理</b>\n\n"
+        if len(entries) == 1:
+            notification += f"标题: <b>{esc(entries[0]['item_name'])}</b>\n"
+            notification += f"类型: {esc(entries[0]['item_type'])}\n"
+        else:
+            names = list(dict.fromkeys(entry["item_name"] for entry in entries))
+            notification += f"标题: <b>{esc('、'.join(str(name) for name in names[:10]))}</b>"
+            notification += f" 等{len(names)}项\n" if len(names) > 10 else "\n"
+        
+        torrents = list({entry["hash"]: entry for entry in entries if entry.get("torrent")}.values())
+        if success and len(torrents) == 1:
+            result = torrents[0]["torrent"]
+            notification += f"种子名称: {esc(result['name'])}\n"
+            notification += f"添加时间: {result['added_on']}\n"
+            notification += f"上传流量: {result['uploaded']} GB\n"
+            notification += f"Tracker: {esc(result['tracker'])}\n"
+            if result['tags']:
+                notification += f"种子标签: {esc(', '.join(result['tags']))}\n"
+            notification += f"状态: ✓ 已删除\n"
+        elif success:
+            freed = sum(entry.get("size") or 0 for entry in torrents)
+            if self._delete_files:
+                notification += f"共删除 {len(torrents)} 个种子，释放 {round(freed / (1024**3), 2)} GB\n"
             else:
-                logger.info("发送纯文本消息")
-                url = f"https://api.telegram.org/bot{self._telegram_token}/sendMessage"
-                data = {
-                    "chat_id": self._telegram_chat_id,
-                    "text": message,
-                    "parse_mode": "HTML"
-                }
-                logger.info("发送请求到Telegram API")
-                response = requests.post(url, data=data)
-            
-            response.raise_for_status()
-            logger.info("Telegram消息发送成功")
-            return True
-        except Exception as e:
-            logger.error(f"发送Telegram通知失败: {str(e)}")
-            return False
+                notification += f"共删除 {len(torrents)} 个种子\n"
+            for entry in torrents[:10]:
+                notification += f"种子名称: {esc(entry['torrent']['name'])}\n"
+            if len(torrents) > 10:
+                notification += f"……\n"
+            notification += f"状态: ✓ 已删除\n"
+        else:
+            notification += f"状态: ✗ 失败\n"
+            notification += f"详情: {esc(detail)}"
+        return notification
+
+    # 从Emby媒体项中获取文件大小
+    @staticmethod
+    def _get_item_size(item: dict) -> Optional[int]:
+        size = item.get("Size")
+        if not size:
+            for source in item.get("MediaSources") or []:
+                if source.get("Size"):
+                    size = source.get("Size")
+                    break
+        try:
+            return int(size) if size else None
+        except (TypeError, ValueError):
+            return None
 
     # 处理单个媒体项
     def process_media_item(self, item_data):
+        start = time.perf_counter()
+        item_key = self._item_key(item_data)
         try:
             logger.info("="*50)
             logger.info("开始处理新的媒体项")
@@ -433,66 +2361,109 @@ class EmbyQbCleaner(_PluginBase):
             item_type = item.get("Type", "未知")
             file_path = item.get("Path", "")
             item_id = item.get("Id", "")
+            file_size = self._get_item_size(item)
             
             if not file_path:
                 logger.warning("数据中没有文件路径，跳过处理")
                 return
             
             # 检查是否是目标库的媒体
-            is_target = self.is_in_target_library(item_data) or self._target_library.lower() in file_path.lower()
-            if not is_target:
+            with self._metrics.timer("library_check"):
+                in_target = self.is_in_target_library(item_data)
+            if not in_target:
                 logger.info(f"忽略非目标媒体库的媒体: {item_name}")
                 return
             
-            # 获取封面图片URL
-            image_url = None
-            try:
-                # 使用 Emby API 获取图片URL
-                token = self.get_emby_token()
-                if token:
-                    image_url = f"{self._emby_host}/emby/Items/{item_id}/Images/Primary?api_key={token}"
-            except Exception as e:
-                logger.error(f"获取封面图片URL失败: {str(e)}")
-            
-            # 删除种子
-            success, result = self.delete_torrent_by_file(file_path)
-            
-            # 准备通知消息
-            notification = f"✅ <b>媒体清理</b>\n\n"
-            notification += f"标题: <b>{item_name}</b>\n"
-            notification += f"类型: {item_type}\n"
-            
-            if success and isinstance(result, dict):
-                notification += f"种子名称: {result['name']}\n"
-                notification += f"添加时间: {result['added_on']}\n"
-                notification += f"上传流量: {result['uploaded']} GB\n"
-                notification += f"Tracker: {result['tracker']}\n"
-                if result['tags']:
-                    notification += f"种子标签: {', '.join(result['tags'])}\n"
-                notification += f"状态: ✓ 已删除\n"
+            # 上次退出前已匹配的任务，同步种子列表确认种子仍存在后直接使用记录的种子
+            job = self._journal.get(item_key) if item_key else None
+            downloader = self.get_downloader(job["downloader"]) \
+                if job and job["state"] == CleanupJournal.MATCHED and job["downloader"] else None
+            if downloader:
+                try:
+                    self._refresh_downloader(downloader)
+                except CircuitOpenError:
+                    raise
+                except Exception as e:
+                    logger.error(f"同步种子列表失败 [{downloader.name}]: {str(e)}")
+                    downloader = None
+            if downloader and job["hash"] in downloader.index:
+                logger.info(f"从任务日志恢复已匹配的种子 [{downloader.name}]: {job['hash']}")
+                torrent_hash, error = job["hash"], ""
+                image_url = job["entry"].get("image_url")
             else:
-                notification += f"状态: ✗ 失败\n"
-                notification += f"详情: {result}"
-            
-            # 发送通知
-            if self._send_notification:
+                # 整理历史中的种子已被之前的任务删除，直接由任务日志应答
+                history_hash = self._lookup_history(file_path)
+                if self._journal.hash_done(history_hash):
+                    self._answer_cleaned(item_key, history_hash)
+                    return
+                
+                # 获取封面图片URL
+                image_url = None
                 try:
-                    # 使用 MoviePilot 的通知系统
-                    self.post_message(
-                        mtype=NotificationType.Plugin,
-                        title="媒体清理通知",
-                        text=notification.replace('<b>', '').replace('</b>', ''),
-                        image=image_url  # 使用图片URL而不是二进制数据
-                    )
+                    image_url = self.get_image_url(item_id)
                 except Exception as e:
-                    logger.error(f"发送通知失败: {str(e)}")
+                    logger.error(f"获取封面图片URL失败: {str(e)}")
+                
+                # 查找种子
+                downloader, torrent_hash, error = self.find_torrent(file_path, file_size, history_hash,
+                                                                    history_checked=True)
+                if self._journal.hash_done(torrent_hash):
+                    self._answer_cleaned(item_key, torrent_hash)
+                    return
+            entry = {
+                "downloader": downloader.name if downloader else None,
+                "hash": torrent_hash,
+                "item_data": item_data,
+                "item_name": item_name,
+                "item_type": item_type,
+                "image_url": image_url
+            }
+            if not torrent_hash:
+                # 有实例不可用时无法确定种子是否存在，暂存任务待恢复后重试
+                if self._park_item(item_data, error):
+                    return
+                # 已匹配的任务种子已不存在时同样结束记录，重启后不再恢复和重复通知
+                if item_key:
+                    self._journal.remove(item_key)
+                self.send_cleanup_notification([entry], False, error)
+                return
             
-            logger.info("媒体项处理完成")
+            torrent = downloader.index.torrents.get(torrent_hash) or {}
+            entry["torrent"] = self.build_torrent_info(torrent)
+            entry["size"] = torrent.get("size") or 0
+            if item_key:
+                self._journal.update(item_key, CleanupJournal.MATCHED, downloader=downloader.name,
+                                     hash=torrent_hash, entry=self._journal_entry(entry))
+            
+            # 季包在全部正片播放完成后才删除
+            remaining = self._pack_remaining(downloader, torrent_hash, item_key)
+            if remaining:
+                logger.info(f"季包 {torrent.get('name')} 还有 {remaining} 集未播放，暂不删除")
+                return
+            
+            # 加入批量删除，窗口结束时统一删除并通知
+            self._batcher.add(entry)
+            
+            logger.info(f"媒体项处理完成，耗时 {time.perf_counter() - start:.2f} 秒")
             logger.info("="*50)
             
+        except CircuitOpenError as e:
+            self._park_item(item_data, str(e))
         except Exception as e:
             logger.error(f"处理媒体项时出错: {str(e)}")
             logger.error("="*50)
+            # 出错的任务不保留记录，之后的事件重新处理
+            if item_key:
+                self._journal.remove(item_key)
+
+    def _answer_cleaned(self, item_key: str, torrent_hash: str):
+        """
+        种子已被之前的任务删除，记录为已完成，不再删除和通知
+        """
+        logger.info(f"种子已在之前的任务中删除，跳过: {torrent_hash}")
+        self._metrics.inc("lookups", source="journal", result="hit")
+        if item_key:
+            self._journal.update(item_key, CleanupJournal.NOTIFIED, hash=torrent_hash)
 
     @eventmanager.register(EventType.WebhookMessage)
     def process_webhook_event(self, event: Event):
@@ -524,7 +2495,7 @@ class EmbyQbCleaner(_PluginBase):
                     }
                 }
                 
-                # 处理媒体项
-                self.process_media_item(item_data)
+                # 加入处理队列
+                self.submit_media_item(item_data)
             except Exception as e:
                 logger.error(f"处理Webhook事件出错: {str(e)}") 
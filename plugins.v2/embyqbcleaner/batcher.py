@@ -0,0 +1,60 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from app.log import logger
+
+
+class DeleteBatcher:
+    """
+    删除批处理：在时间窗口内收集待删除的种子，合并为一次删除请求和一条通知
+    """
+
+    def __init__(self, window: float, handler: Callable[[List[Dict[str, Any]]], None]):
+        # 窗口为0时不合并，立即处理
+        self.window = max(0.0, float(window))
+        self.handler = handler
+        self._entries: List[Dict[str, Any]] = []
+        self._timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry: Dict[str, Any]):
+        """
+        加入待删除条目，窗口结束时统一处理
+        """
+        if not self.window:
+            self._handle([entry])
+            return
+        with self._lock:
+            self._entries.append(entry)
+            if self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        立即处理已收集的条目
+        """
+        with self._lock:
+            entries, self._entries = self._entries, []
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if entries:
+            self._handle(entries)
+
+    def _handle(self, entries: List[Dict[str, Any]]):
+        try:
+            self.handler(entries)
+        except Exception as e:
+            logger.error(f"批量删除种子出错: {str(e)}")
+
+    def stop(self):
+        """
+        停止前处理剩余条目
+        """
+        self.flush()
@@ -0,0 +1,141 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from app.log import logger
+
+
+class CircuitOpenError(Exception):
+    """
+    下载器熔断中，请求未发送
+    """
+
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制：请求耗时低于目标时逐步放宽，超时或变慢时减半（AIMD）
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 16, target_latency: float = 1.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self._limit = float(max(minimum, min(maximum, initial)))
+        self._inflight = 0
+        self._decreased_at = 0.0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def acquire(self):
+        with self._cond:
+            while self._inflight >= int(self._limit):
+                self._cond.wait()
+            self._inflight += 1
+
+    def release(self, latency: float, ok: bool = True):
+        """
+        归还并发名额，按本次请求的耗时调整限制
+        """
+        with self._cond:
+            self._inflight -= 1
+            now = time.monotonic()
+            if not ok or latency > self.target_latency:
+                # 同一批慢请求只减半一次
+                if now - self._decreased_at >= self.target_latency:
+                    self._limit = max(self.minimum, self._limit / 2)
+                    self._decreased_at = now
+            else:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败达到阈值后熔断，冷却后放行一个试探请求，成功则恢复，失败则加倍冷却时间
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    # 页面和日志中显示的状态名称
+    STATE_NAMES = {CLOSED: "正常", OPEN: "熔断", HALF_OPEN: "试探"}
+
+    def __init__(self, name: str = "", failure_threshold: int = 5, reset_timeout: float = 30,
+                 max_reset_timeout: float = 600, on_change: Optional[Callable[[str, str], None]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        # 状态变化时回调 (旧状态, 新状态)
+        self.on_change = on_change
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._timeout = reset_timeout
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def retry_at(self) -> float:
+        """
+        熔断状态下允许试探的时间
+        """
+        return self.opened_at + self._timeout if self.state == self.OPEN else 0.0
+
+    def allow(self) -> bool:
+        """
+        是否放行请求，熔断冷却结束后只放行一个试探请求
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.time() < self.opened_at + self._timeout:
+                    return False
+                self._transition(self.HALF_OPEN)
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._timeout = self.reset_timeout
+                self._transition(self.CLOSED)
+
+    def record_failure(self, error: str = ""):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN:
+                self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+                self._open(error)
+            elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open(error)
+
+    def _open(self, error: str):
+        self.opened_at = time.time()
+        self._transition(self.OPEN)
+        logger.warning(f"qBittorrent [{self.name}] 连续 {self.failures} 次请求失败，熔断 {self._timeout:.0f} 秒"
+                       + (f": {error}" if error else ""))
+
+    def _transition(self, state: str):
+        old, self.state = self.state, state
+        if state == self.CLOSED:
+            logger.info(f"qBittorrent [{self.name}] 已恢复，熔断解除")
+        elif state == self.HALF_OPEN:
+            logger.info(f"qBittorrent [{self.name}] 熔断冷却结束，发送试探请求")
+        if self.on_change:
+            try:
+                self.on_change(old, state)
+            except Exception as e:
+                logger.debug(f"熔断状态回调出错: {str(e)}")
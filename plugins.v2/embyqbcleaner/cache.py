@@ -0,0 +1,100 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, List, Optional, Tuple
+
+
+class LruCache:
+    """
+    线程安全的LRU缓存，超过容量时淘汰最久未使用的条目
+    """
+
+    def __init__(self, maxsize: int = 1000):
+        self.maxsize = max(1, int(maxsize))
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key: Hashable):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """
+        按使用顺序返回全部条目，最近使用的在最后
+        """
+        with self._lock:
+            return list(self._data.items())
+
+    def load(self, items: Optional[List[Tuple[Hashable, Any]]]):
+        """
+        批量恢复条目
+        """
+        for key, value in items or []:
+            self.set(key, value)
+
+
+class TtlCache:
+    """
+    带过期时间的线程安全缓存，超过容量时淘汰最早写入的条目
+    """
+
+    def __init__(self, ttl: float = 300, maxsize: int = 1000):
+        self.ttl = ttl
+        self.maxsize = max(1, int(maxsize))
+        # key -> (过期时间, 值)
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            if entry[0] <= time.time():
+                self._data.pop(key, None)
+                return default
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (time.time() + (ttl if ttl is not None else self.ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            return entry[1] if entry else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
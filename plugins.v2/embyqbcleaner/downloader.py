@@ -0,0 +1,85 @@
+import threading
+from typing import List, Optional, Tuple
+
+from app.log import logger
+
+from .breaker import CircuitBreaker
+from .inodeindex import InodeIndex
+from .qbclient import QbSession
+from .torrentindex import TorrentIndex
+
+# 默认实例名称，对应原有的单个qBittorrent配置
+DEFAULT_NAME = "默认"
+
+
+class Downloader:
+    """
+    单个qBittorrent实例：独立的会话与种子文件索引
+    """
+
+    def __init__(self, name: str, host: str, username: str, password: str, metrics=None):
+        self.name = name
+        self.session = QbSession(host=host, username=username, password=password,
+                                 metrics=metrics, name=name)
+        self.index = TorrentIndex()
+        # 种子数据文件的inode索引，及其同步时种子索引的版本
+        self.inodes = InodeIndex()
+        self.inodes_generation = -1
+        # 索引只从持久化数据加载一次
+        self.load_lock = threading.Lock()
+        self.loaded = False
+        self.saved_at = 0
+
+    @property
+    def key(self) -> Tuple[str, str, str, str]:
+        """
+        实例配置，配置未变化时可继续复用会话和索引
+        """
+        return (self.name,) + self.session.key
+
+    @property
+    def data_key(self) -> str:
+        """
+        索引的持久化键，默认实例沿用旧版本的键
+        """
+        return "torrent_index" if self.name == DEFAULT_NAME else f"torrent_index_{self.name}"
+
+    def client(self) -> Optional[QbSession]:
+        """
+        获取已登录的会话，连接失败时返回None
+        """
+        if not self.session.available:
+            logger.warning(f"qBittorrent [{self.name}] 熔断中，暂不请求")
+            return None
+        try:
+            # 首次使用时登录，之后复用会话
+            self.session.connect()
+            return self.session
+        except Exception as e:
+            logger.error(f"连接qBittorrent失败 [{self.name}]: {e}")
+            return None
+
+    @property
+    def healthy(self) -> bool:
+        """
+        最近的请求成功且未熔断，查找失败时可以确定种子不在此实例中
+        """
+        breaker = self.session.breaker
+        return breaker.state == CircuitBreaker.CLOSED and not breaker.failures
+
+    def close(self):
+        self.session.close()
+
+
+def parse_instances(text: str) -> List[Tuple[str, str, str, str]]:
+    """
+    解析额外的qBittorrent实例配置，每行一个：名称#地址#用户名#密码
+    """
+    instances = []
+    for line in (text or "").splitlines():
+        parts = [p.strip() for p in line.strip().split("#", 3)]
+        if len(parts) < 2 or not parts[0] or not parts[1]:
+            continue
+        parts += [""] * (4 - len(parts))
+        instances.append((parts[0], parts[1], parts[2], parts[3]))
+    return instances
@@ -0,0 +1,133 @@
+import os
+import stat
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.log import logger
+
+# 文件标识 (st_dev, st_ino)，硬链接的文件标识相同
+FileKey = Tuple[int, int]
+
+
+def file_key(path: str) -> Optional[FileKey]:
+    """
+    获取文件的设备号和inode，文件不存在时返回None
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_dev, st.st_ino
+
+
+class InodeIndex:
+    """
+    种子数据文件的inode索引：媒体库中硬链接的文件即使改名，也能通过inode找到种子
+    """
+    # 按目录修改时间校验索引的最短间隔（秒）
+    REVALIDATE_INTERVAL = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (st_dev, st_ino) -> hash
+        self._by_key: Dict[FileKey, str] = {}
+        # hash -> (本地路径, {目录或文件: 修改时间}, [文件标识])
+        self._roots: Dict[str, Tuple[str, Dict[str, float], List[FileKey]]] = {}
+        self.checked_at = 0.0
+
+    def __len__(self):
+        return len(self._by_key)
+
+    @staticmethod
+    def _walk(path: str) -> Tuple[Dict[str, float], List[FileKey]]:
+        """
+        遍历种子的本地路径，记录各目录的修改时间和文件标识
+        """
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {}, []
+        if not stat.S_ISDIR(st.st_mode):
+            return {path: st.st_mtime}, [(st.st_dev, st.st_ino)]
+        mtimes: Dict[str, float] = {}
+        keys: List[FileKey] = []
+        stack = [(path, st)]
+        while stack:
+            directory, dir_st = stack.pop()
+            mtimes[directory] = dir_st.st_mtime
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            try:
+                                stack.append((entry.path, entry.stat(follow_symlinks=False)))
+                            except OSError:
+                                continue
+                        elif entry.is_file(follow_symlinks=False):
+                            # 同一目录下的文件与目录在同一设备上，inode由目录项直接给出，无需逐个stat
+                            keys.append((dir_st.st_dev, entry.inode()))
+            except OSError as e:
+                logger.debug(f"读取目录失败 {directory}: {str(e)}")
+        return mtimes, keys
+
+    def _add(self, torrent_hash: str, path: str):
+        mtimes, keys = self._walk(path)
+        self._roots[torrent_hash] = (path, mtimes, keys)
+        for key in keys:
+            self._by_key[key] = torrent_hash
+
+    def _drop(self, torrent_hash: str):
+        _, _, keys = self._roots.pop(torrent_hash, ("", {}, []))
+        for key in keys:
+            if self._by_key.get(key) == torrent_hash:
+                self._by_key.pop(key, None)
+
+    def sync(self, paths: Dict[str, str]):
+        """
+        按种子的本地路径同步索引：移除已删除的种子，遍历新增或路径变化的种子
+        """
+        with self._lock:
+            for torrent_hash in [h for h, root in self._roots.items() if paths.get(h) != root[0]]:
+                self._drop(torrent_hash)
+            added = [(h, path) for h, path in paths.items() if h not in self._roots]
+            if not added:
+                return
+            start = time.perf_counter()
+            for torrent_hash, path in added:
+                self._add(torrent_hash, path)
+            logger.info(f"已建立 {len(added)} 个种子的inode索引，耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def revalidate(self, force: bool = False) -> bool:
+        """
+        检查各种子目录的修改时间，仅重新遍历有变化或之前不存在的种子，返回是否有更新
+        """
+        with self._lock:
+            if not force and time.time() - self.checked_at < self.REVALIDATE_INTERVAL:
+                return False
+            self.checked_at = time.time()
+            changed = []
+            for torrent_hash, (path, mtimes, _) in self._roots.items():
+                if not mtimes:
+                    changed.append((torrent_hash, path))
+                    continue
+                for directory, mtime in mtimes.items():
+                    try:
+                        if os.stat(directory).st_mtime != mtime:
+                            changed.append((torrent_hash, path))
+                            break
+                    except OSError:
+                        changed.append((torrent_hash, path))
+                        break
+            for torrent_hash, path in changed:
+                self._drop(torrent_hash)
+                self._add(torrent_hash, path)
+            return bool(changed)
+
+    def lookup(self, key: Optional[FileKey]) -> Optional[str]:
+        """
+        根据文件标识查找种子hash
+        """
+        if not key:
+            return None
+        return self._by_key.get(key)
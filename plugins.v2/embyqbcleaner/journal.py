@@ -0,0 +1,235 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.log import logger
+
+
+class CleanupJournal:
+    """
+    清理任务日志：记录每个媒体项的处理状态，重启后恢复未完成的任务
+
+    状态依次为 received（已接收）、matched（已匹配种子）、deleted（已删除）、notified（已通知）。
+    查询全部在内存中完成，写入由后台线程合并后按事务提交。
+    """
+    RECEIVED = "received"
+    MATCHED = "matched"
+    DELETED = "deleted"
+    NOTIFIED = "notified"
+    # 未完成的状态，重启后需要继续处理
+    PENDING_STATES = (RECEIVED, MATCHED, DELETED)
+    # 种子已被删除的状态
+    DONE_STATES = (DELETED, NOTIFIED)
+    # 后台写入间隔（秒）
+    FLUSH_INTERVAL = 1.0
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        # item_key -> 任务
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # 待写入的变更，item_key -> 任务，None 表示删除
+        self._changes: Dict[str, Optional[Dict[str, Any]]] = {}
+        # 已删除的种子 hash -> 引用的任务数，季包的多个媒体项对应同一个种子
+        self._done_hashes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def open(self):
+        """
+        打开数据库并加载全部任务，启动后台写入线程
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS jobs ("
+                           "item_key TEXT PRIMARY KEY, state TEXT NOT NULL, downloader TEXT, hash TEXT, "
+                           "data TEXT, updated_at REAL NOT NULL)")
+        self._conn.commit()
+        rows = self._conn.execute("SELECT item_key, state, downloader, hash, data, updated_at FROM jobs").fetchall()
+        for item_key, state, downloader, torrent_hash, data, updated_at in rows:
+            try:
+                data = json.loads(data) if data else {}
+            except ValueError:
+                data = {}
+            self._jobs[item_key] = {
+                "item_key": item_key,
+                "state": state,
+                "downloader": downloader,
+                "hash": torrent_hash,
+                "item_data": data.get("item_data") or {},
+                "entry": data.get("entry") or {},
+                "updated_at": updated_at
+            }
+            self._index_hash(self._jobs[item_key], 1)
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="EmbyQbCleaner-journal", daemon=True)
+        self._thread.start()
+
+    def get(self, item_key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(item_key)
+            return dict(job) if job else None
+
+    def hash_done(self, torrent_hash: Optional[str]) -> bool:
+        """
+        种子是否已被之前的任务删除
+        """
+        if not torrent_hash:
+            return False
+        with self._lock:
+            return torrent_hash in self._done_hashes
+
+    def receive(self, item_key: str, item_data: dict) -> bool:
+        """
+        记录新接收的任务，已有记录时返回False
+        """
+        with self._lock:
+            if item_key in self._jobs:
+                return False
+            self._put({
+                "item_key": item_key,
+                "state": self.RECEIVED,
+                "downloader": None,
+                "hash": None,
+                "item_data": item_data,
+                "entry": {}
+            })
+        return True
+
+    def update(self, item_key: str, state: str, **fields: Any):
+        """
+        更新任务状态及字段（downloader、hash、entry）
+        """
+        with self._lock:
+            job = self._jobs.get(item_key)
+            if job is None:
+                return
+            self._put(dict(job, state=state, **fields))
+
+    def set_state(self, item_keys: Iterable[str], state: str):
+        """
+        批量更新任务状态
+        """
+        with self._lock:
+            for item_key in item_keys:
+                job = self._jobs.get(item_key)
+                if job is not None and job["state"] != state:
+                    self._put(dict(job, state=state))
+
+    def remove(self, item_key: str):
+        """
+        删除任务记录，之后同一媒体项的事件会重新处理
+        """
+        with self._lock:
+            job = self._jobs.pop(item_key, None)
+            if job is not None:
+                self._index_hash(job, -1)
+                self._changes[item_key] = None
+                self._wakeup.set()
+
+    def import_done(self, items: Dict[str, Any]):
+        """
+        导入已完成的媒体项（旧版本的已清理记录）
+        """
+        with self._lock:
+            for item_key, cleaned_at in items.items():
+                if item_key not in self._jobs:
+                    self._put({"item_key": item_key, "state": self.NOTIFIED, "downloader": None, "hash": None,
+                               "item_data": {}, "entry": {}}, updated_at=float(cleaned_at or time.time()))
+
+    def pending(self) -> List[Dict[str, Any]]:
+        """
+        未完成的任务，按接收顺序排列
+        """
+        with self._lock:
+            jobs = [dict(job) for job in self._jobs.values() if job["state"] in self.PENDING_STATES]
+        return sorted(jobs, key=lambda job: job["updated_at"])
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["state"] in self.PENDING_STATES)
+
+    def prune(self, days: int):
+        """
+        清理超过保留天数的已完成任务
+        """
+        expire = time.time() - days * 86400
+        with self._lock:
+            for item_key in [k for k, job in self._jobs.items()
+                             if job["state"] == self.NOTIFIED and job["updated_at"] < expire]:
+                self._index_hash(self._jobs.pop(item_key), -1)
+                self._changes[item_key] = None
+            self._wakeup.set()
+
+    def _put(self, job: Dict[str, Any], updated_at: float = None):
+        job["updated_at"] = updated_at or time.time()
+        old = self._jobs.get(job["item_key"])
+        if old is not None:
+            self._index_hash(old, -1)
+        self._index_hash(job, 1)
+        self._jobs[job["item_key"]] = job
+        self._changes[job["item_key"]] = job
+        self._wakeup.set()
+
+    def _index_hash(self, job: Dict[str, Any], delta: int):
+        torrent_hash = job.get("hash")
+        if not torrent_hash or job["state"] not in self.DONE_STATES:
+            return
+        count = self._done_hashes.get(torrent_hash, 0) + delta
+        if count > 0:
+            self._done_hashes[torrent_hash] = count
+        else:
+            self._done_hashes.pop(torrent_hash, None)
+
+    def flush(self):
+        """
+        将累积的变更在一个事务中写入
+        """
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        if not changes or not self._conn:
+            return
+        upserts = [(k, job["state"], job["downloader"], job["hash"],
+                    json.dumps({"item_data": job["item_data"], "entry": job["entry"]}, ensure_ascii=False),
+                    job["updated_at"]) for k, job in changes.items() if job is not None]
+        deletes = [(k,) for k, job in changes.items() if job is None]
+        try:
+            with self._conn:
+                if upserts:
+                    self._conn.executemany("INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?)", upserts)
+                if deletes:
+                    self._conn.executemany("DELETE FROM jobs WHERE item_key = ?", deletes)
+        except Exception as e:
+            logger.error(f"写入清理任务日志失败: {str(e)}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait()
+            # 等待一个写入间隔，合并这段时间内的全部变更
+            self._stopped.wait(self.FLUSH_INTERVAL)
+            self._wakeup.clear()
+            self.flush()
+
+    def close(self):
+        """
+        写入剩余变更并关闭数据库
+        """
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+        if self._conn:
+            self._conn.close()
+            self._conn = None
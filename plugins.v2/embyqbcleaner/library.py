@@ -0,0 +1,68 @@
+from typing import Any, Dict, List, Optional
+
+
+def split_path(path: str) -> List[str]:
+    """
+    拆分并归一化路径：统一分隔符、忽略大小写
+    """
+    if not path:
+        return []
+    return [part for part in str(path).replace("\\", "/").casefold().split("/") if part]
+
+
+class PathPrefixTrie:
+    """
+    路径前缀树：按目录逐级匹配，返回最长前缀对应的值；构建完成后只读，可多线程共享
+    """
+    # 节点上保存值的键，不会与目录名冲突
+    _VALUE = "\0"
+
+    def __init__(self):
+        self._root: Dict[str, Any] = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def insert(self, path: str, value: Any):
+        """
+        添加目录前缀
+        """
+        parts = split_path(path)
+        if not parts:
+            return
+        node = self._root
+        for part in parts:
+            node = node.setdefault(part, {})
+        if self._VALUE not in node:
+            self._size += 1
+        node[self._VALUE] = value
+
+    def match(self, path: str) -> Optional[Any]:
+        """
+        查找路径所属的最长前缀，未匹配时返回None
+        """
+        node = self._root
+        found = None
+        for part in split_path(path):
+            node = node.get(part)
+            if node is None:
+                break
+            if self._VALUE in node:
+                found = node[self._VALUE]
+        return found
+
+    @classmethod
+    def from_libraries(cls, libraries: List[dict], targets: List[str]) -> "PathPrefixTrie":
+        """
+        根据媒体库的物理目录构建前缀树，targets为媒体库ID或名称
+        """
+        wanted = {str(t).casefold() for t in targets}
+        trie = cls()
+        for library in libraries:
+            if str(library.get("Id") or "").casefold() not in wanted \
+                    and str(library.get("Name") or "").casefold() not in wanted:
+                continue
+            for location in library.get("Locations") or []:
+                trie.insert(location, library.get("Name"))
+        return trie
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class StageStats:
+    """
+    单个阶段的耗时统计，保留最近的样本用于计算分位数
+    """
+
+    def __init__(self, samples: int = 1000):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.recent = deque(maxlen=samples)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.recent.append(seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+class Metrics:
+    """
+    插件运行指标：各处理阶段耗时、计数器和实时数值
+    """
+    # 导出的分位数
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, prefix: str = "embyqbcleaner"):
+        self.prefix = prefix
+        self._stages: Dict[str, StageStats] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float):
+        """
+        记录阶段耗时（秒）
+        """
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats()
+            stats.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        统计代码块耗时
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def inc(self, name: str, value: float = 1, **labels: Any):
+        """
+        计数器累加
+        """
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, func: Callable[[], float]):
+        """
+        注册实时数值，导出时调用func取值
+        """
+        with self._lock:
+            self._gauges[name] = func
+
+    def _gauge_values(self) -> Dict[str, float]:
+        values = {}
+        for name, func in list(self._gauges.items()):
+            try:
+                values[name] = float(func() or 0)
+            except Exception:
+                values[name] = 0.0
+        return values
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        导出当前指标
+        """
+        with self._lock:
+            stages = {name: {
+                "count": stats.count,
+                "avg": stats.total / stats.count if stats.count else 0.0,
+                "p50": stats.quantile(0.5),
+                "p99": stats.quantile(0.99),
+                "max": stats.max
+            } for name, stats in self._stages.items()}
+            counters = [(name, dict(labels), value) for (name, labels), value in self._counters.items()]
+        return {"stages": stages, "counters": counters, "gauges": self._gauge_values()}
+
+    def counter_total(self, name: str, **labels: Any) -> float:
+        """
+        汇总名称和标签匹配的计数
+        """
+        wanted = {k: str(v) for k, v in labels.items()}
+        with self._lock:
+            return sum(value for (counter, labels), value in self._counters.items()
+                       if counter == name and all(dict(labels).get(k) == v for k, v in wanted.items()))
+
+    @staticmethod
+    def _labels(labels: Dict[str, Any]) -> str:
+        if not labels:
+            return ""
+        pairs = []
+        for key, value in sorted(labels.items()):
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+
+    def to_prometheus(self) -> str:
+        """
+        按Prometheus文本格式导出
+        """
+        lines: List[str] = []
+        with self._lock:
+            stages = [(stage, [stats.quantile(q) for q in self.QUANTILES], stats.total, stats.count)
+                      for stage, stats in sorted(self._stages.items())]
+            counters = sorted(self._counters.items())
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines.append(f"# HELP {name} 各处理阶段耗时")
+        lines.append(f"# TYPE {name} summary")
+        for stage, quantiles, total, count in stages:
+            for q, value in zip(self.QUANTILES, quantiles):
+                lines.append(f"{name}{self._labels({'stage': stage, 'quantile': q})} {value:.6f}")
+            lines.append(f"{name}_sum{self._labels({'stage': stage})} {total:.6f}")
+            lines.append(f"{name}_count{self._labels({'stage': stage})} {count}")
+        declared = set()
+        for (counter, labels), value in counters:
+            metric = f"{self.prefix}_{counter}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{self._labels(dict(labels))} {value:g}")
+        for gauge, value in sorted(self._gauge_values().items()):
+            metric = f"{self.prefix}_{gauge}"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {value:g}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,163 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+from app.log import logger
+
+
+class RetryAfter(Exception):
+    """
+    发送被限流，需等待指定秒数后重试
+    """
+
+    def __init__(self, seconds: float, message: str = ""):
+        super().__init__(message or f"请求过于频繁，{seconds} 秒后重试")
+        self.seconds = seconds
+
+
+class DeliveryRejected(Exception):
+    """
+    通知被拒绝（如消息格式错误），重试也不会成功
+    """
+
+
+class TokenBucket:
+    """
+    令牌桶限流：平均每秒rate个，允许突发capacity个
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        取走一个令牌，返回需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class NotificationDispatcher:
+    """
+    后台通知队列：窗口内的通知合并为摘要，限流发送，被限流或临时失败时退避重试，不阻塞调用方
+    """
+    # 队列上限，超出时丢弃通知
+    MAX_PENDING = 1000
+
+    def __init__(self, window: float, digest: Callable[[List[Any]], List[Any]],
+                 deliver: Callable[[Any], None], rate: float = 0.5, burst: int = 5, retries: int = 3):
+        # 合并窗口（秒），为0时不合并
+        self.window = max(0.0, float(window))
+        self.digest = digest
+        self.deliver = deliver
+        self.retries = retries
+        self._bucket = TokenBucket(rate=rate, capacity=burst)
+        self._queue: queue.Queue = queue.Queue(maxsize=self.MAX_PENDING)
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def start(self):
+        if self.running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="EmbyQbCleaner-notify", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> bool:
+        """
+        加入通知，立即返回
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(item)
+            return True
+        except queue.Full:
+            logger.warning(f"通知队列已满（{self.MAX_PENDING}），丢弃通知")
+            return False
+
+    def _collect(self) -> List[Any]:
+        """
+        等待第一条通知，再收集窗口内的其余通知
+        """
+        items = []
+        try:
+            items.append(self._queue.get(timeout=1))
+        except queue.Empty:
+            return items
+        deadline = time.monotonic() + self.window
+        while not self._stopped.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=min(remaining, 1)))
+            except queue.Empty:
+                continue
+        # 退出时一并处理剩余的通知
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                return items
+
+    def _run(self):
+        while not (self._stopped.is_set() and self._queue.empty()):
+            items = self._collect()
+            if not items:
+                continue
+            try:
+                messages = self.digest(items)
+            except Exception as e:
+                logger.error(f"生成通知摘要失败: {str(e)}")
+                continue
+            for message in messages:
+                self._send(message)
+
+    def _send(self, message: Any):
+        for attempt in range(self.retries + 1):
+            wait = self._bucket.reserve()
+            if wait:
+                time.sleep(wait)
+            try:
+                self.deliver(message)
+                return
+            except RetryAfter as e:
+                delay = e.seconds
+                logger.warning(f"通知发送被限流，{delay} 秒后重试")
+            except DeliveryRejected as e:
+                logger.error(f"通知被拒绝，不再重试: {str(e)}")
+                return
+            except Exception as e:
+                delay = 2 ** attempt
+                logger.warning(f"通知发送失败，{delay} 秒后重试: {str(e)}")
+            if attempt < self.retries:
+                time.sleep(delay)
+        logger.error(f"通知发送失败，已重试 {self.retries} 次")
+
+    def stop(self, timeout: float = 30):
+        """
+        发送完剩余的通知后停止
+        """
+        if not self.running:
+            return
+        self._stopped.set()
+        self._thread.join(timeout=timeout)
+        self._thread = None
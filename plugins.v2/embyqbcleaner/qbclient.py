@@ -0,0 +1,189 @@
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Optional, Tuple
+
+from app.log import logger
+
+from .breaker import AdaptiveLimiter, CircuitBreaker, CircuitOpenError
+
+if TYPE_CHECKING:
+    import qbittorrentapi
+
+
+class QbSession:
+    """
+    长期复用的qBittorrent会话：保持连接池，仅在403或会话过期时重新登录；
+    每个请求设置超时，按响应耗时自适应限制并发，连续失败时熔断
+    """
+    # 登录失败后的冷却时间（秒），避免触发qBittorrent的登录频率封禁
+    LOGIN_COOLDOWN = 30
+    # 连接超时与默认读取超时（秒）
+    CONNECT_TIMEOUT = 5
+    READ_TIMEOUT = 15
+    # 各接口的读取超时（秒），全量同步和批量删除较慢
+    CALL_TIMEOUTS = {"sync_maindata": 60, "torrents_delete": 30}
+    # 请求耗时超过此值（秒）时降低并发
+    TARGET_LATENCY = 2.0
+
+    def __init__(self, host: str, username: str, password: str, pool_size: int = 10, metrics=None,
+                 name: str = ""):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.pool_size = pool_size
+        # 运行指标，统计请求次数与耗时
+        self.metrics = metrics
+        # 实例名称，用于区分多个qBittorrent的指标
+        self.name = name
+        # qbittorrentapi 在首次连接时才导入，插件加载时不引入
+        self._client: Optional["qbittorrentapi.Client"] = None
+        self._lock = threading.RLock()
+        self._login_failed_at = 0
+        self.limiter = AdaptiveLimiter(initial=min(4, pool_size), maximum=pool_size,
+                                       target_latency=self.TARGET_LATENCY)
+        self.breaker = CircuitBreaker(name=name or host, on_change=self._on_breaker_change)
+
+    @property
+    def key(self) -> Tuple[str, str, str]:
+        """
+        连接配置，配置未变化时可继续复用会话
+        """
+        return self.host, self.username, self.password
+
+    def _login(self, client: "qbittorrentapi.Client"):
+        import qbittorrentapi
+        if time.time() - self._login_failed_at < self.LOGIN_COOLDOWN:
+            raise qbittorrentapi.LoginFailed("qBittorrent登录失败冷却中，暂不重试")
+        try:
+            self._request(client, "auth_log_in", requests_args=self._requests_args("auth_log_in"))
+            self._login_failed_at = 0
+        except Exception:
+            self._login_failed_at = time.time()
+            raise
+
+    def client(self) -> "qbittorrentapi.Client":
+        """
+        获取已登录的客户端，首次使用时创建
+        """
+        with self._lock:
+            if self._client is None:
+                import qbittorrentapi
+                client = qbittorrentapi.Client(
+                    host=self.host,
+                    username=self.username,
+                    password=self.password,
+                    HTTPADAPTER_ARGS={"pool_connections": 1, "pool_maxsize": self.pool_size},
+                    REQUESTS_ARGS=self._requests_args("")
+                )
+                self._login(client)
+                logger.info(f"已登录qBittorrent: {self.host}")
+                self._client = client
+            return self._client
+
+    def relogin(self):
+        """
+        会话失效时重新登录
+        """
+        with self._lock:
+            if self._client is None:
+                self.client()
+                return
+            logger.info(f"qBittorrent会话已失效，重新登录: {self.host}")
+            self._login(self._client)
+
+    def _request(self, client: "qbittorrentapi.Client", method: str, *args, **kwargs):
+        if not self.metrics:
+            return getattr(client, method)(*args, **kwargs)
+        self.metrics.inc("http_requests", target="qbittorrent", method=method, instance=self.name)
+        with self.metrics.timer(f"qb_{method}"):
+            return getattr(client, method)(*args, **kwargs)
+
+    def _requests_args(self, method: str) -> dict:
+        return {"timeout": (self.CONNECT_TIMEOUT, self.CALL_TIMEOUTS.get(method, self.READ_TIMEOUT))}
+
+    @property
+    def available(self) -> bool:
+        """
+        未熔断，或熔断冷却已结束可以试探
+        """
+        return self.breaker.state != CircuitBreaker.OPEN or time.time() >= self.breaker.retry_at
+
+    def _on_breaker_change(self, old: str, state: str):
+        if self.metrics:
+            self.metrics.inc("breaker_transitions", instance=self.name, state=state)
+
+    def _guarded(self, method: str, func: Callable):
+        """
+        经过熔断器和并发限制执行请求：连接失败、超时和5xx计为失败，其余响应说明qBittorrent可用
+        """
+        import qbittorrentapi
+        if not self.breaker.allow():
+            if self.metrics:
+                self.metrics.inc("breaker_rejected", instance=self.name)
+            raise CircuitOpenError(f"qBittorrent [{self.name}] 熔断中，"
+                                   f"{max(0, self.breaker.retry_at - time.time()):.0f} 秒后重试")
+        self.limiter.acquire()
+        start = time.perf_counter()
+        healthy = True
+        try:
+            return func()
+        except qbittorrentapi.HTTP5XXError as e:
+            healthy = False
+            self.breaker.record_failure(str(e) or type(e).__name__)
+            raise
+        except qbittorrentapi.HTTPError:
+            raise
+        except qbittorrentapi.APIConnectionError as e:
+            healthy = False
+            self.breaker.record_failure(str(e) or type(e).__name__)
+            raise
+        finally:
+            self.limiter.release(time.perf_counter() - start, ok=healthy)
+            if healthy:
+                self.breaker.record_success()
+
+    def connect(self) -> "qbittorrentapi.Client":
+        """
+        获取已登录的客户端，未登录时的登录请求计入熔断统计
+        """
+        if self._client is not None:
+            return self._client
+        return self._guarded("auth_log_in", self.client)
+
+    def call(self, method: str, *args, **kwargs):
+        """
+        调用qBittorrent API，遇到403时重新登录并重试一次
+        """
+        import qbittorrentapi
+        kwargs.setdefault("requests_args", self._requests_args(method))
+
+        def _call():
+            try:
+                return self._request(self.client(), method, *args, **kwargs)
+            except qbittorrentapi.Forbidden403Error:
+                self.relogin()
+                return self._request(self.client(), method, *args, **kwargs)
+
+        return self._guarded(method, _call)
+
+    def __getattr__(self, method: str):
+        if method.startswith("_"):
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self.call(method, *args, **kwargs)
+
+    def close(self):
+        """
+        注销并关闭连接池
+        """
+        with self._lock:
+            client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            client.auth_log_out()
+        except Exception as e:
+            logger.debug(f"注销qBittorrent会话失败: {str(e)}")
+        try:
+            client._trigger_session_initialization()
+        except Exception:
+            pass
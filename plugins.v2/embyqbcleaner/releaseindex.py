@@ -0,0 +1,257 @@
+import math
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# 会被去除的文件扩展名
+RELEASE_EXTS = {"mkv", "mp4", "avi", "ts", "m2ts", "iso", "rmvb", "wmv", "mov", "flv", "webm", "mpg",
+                "mpeg", "m4v", "strm", "srt", "ass", "ssa", "sup", "sub", "idx", "nfo", "torrent"}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u3400-\u9fff]+")
+_EXT_RE = re.compile(r"\.([a-z0-9]{2,7})$")
+_SEASON_EPISODE_RE = re.compile(r"\bs(\d{1,2})\s?e(\d{1,4})\b|\b(\d{1,2})x(\d{2,3})\b")
+_CN_NUMBER = r"[零〇一二两三四五六七八九十百]"
+_SEASON_RE = re.compile(r"\bs(\d{1,2})\b|\bseason\s?(\d{1,2})\b|第\s?(\d{1,3}|" + _CN_NUMBER + r"{1,4})\s?季")
+_EPISODE_RE = re.compile(r"\be(?:p)?(\d{2,4})\b|第\s?(\d{1,4}|" + _CN_NUMBER + r"{1,5})\s?[集话話]")
+# 动漫常见的 [01]、【01】、[01v2] 形式的集数
+_BRACKET_EPISODE_RE = re.compile(r"[\[【](\d{1,3})(?:v\d)?[\]】]")
+_RESOLUTION_RE = re.compile(r"\b(2160|1080|720|576|480)[pi]\b|\b(4k|uhd)\b")
+_YEAR_RE = re.compile(r"\b(19\d{2}|20\d{2})\b")
+# 结尾紧跟在名称后的 -GROUP，或开头的 [GROUP]
+_GROUP_RE = re.compile(r"(?<=[a-z0-9\])])-([a-z0-9]+)$|^\[([^\]]+)\]")
+
+
+_CN_DIGITS = {"零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+              "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+def parse_number(text: str) -> int:
+    """
+    解析阿拉伯数字或中文数字（如 十二、二十一、一百零五）
+    """
+    if text.isdigit():
+        return int(text)
+    total = current = 0
+    for char in text:
+        if char == "十":
+            total += (current or 1) * 10
+            current = 0
+        elif char == "百":
+            total += (current or 1) * 100
+            current = 0
+        else:
+            current = _CN_DIGITS[char]
+    return total + current
+
+
+class ReleaseName:
+    """
+    解析后的发布名称：标题等普通词、季集、分辨率、年份和发布组
+    """
+    __slots__ = ("words", "season", "episode", "resolution", "year", "group")
+
+    def __init__(self, words: Set[str], season: Optional[int], episode: Optional[int],
+                 resolution: Optional[int], group: Optional[str], year: Optional[int] = None):
+        self.words = words
+        self.season = season
+        self.episode = episode
+        self.resolution = resolution
+        self.year = year
+        self.group = group
+
+
+def parse_release(name: str) -> ReleaseName:
+    """
+    解析发布名称：取路径最后一段，去除扩展名，统一分隔符，并提取季集、分辨率、年份和发布组
+    """
+    name = unicodedata.normalize("NFKC", str(name or "")).replace("\\", "/").rstrip("/").rsplit("/", 1)[-1]
+    text = name.strip().lower()
+    match = _EXT_RE.search(text)
+    if match and match.group(1) in RELEASE_EXTS:
+        text = text[:match.start()]
+
+    group = None
+    match = _GROUP_RE.search(text)
+    if match:
+        group = match.group(1) or match.group(2).strip() or None
+        text = text[:match.start()] if match.group(1) else text[match.end():]
+    # 括号中的集数在统一分隔符前提取，其他形式的集数优先
+    bracket_episode = None
+    match = _BRACKET_EPISODE_RE.search(text)
+    if match:
+        bracket_episode = int(match.group(1))
+        text = text[:match.start()] + " " + text[match.end():]
+    # 统一分隔符，各种括号、点、下划线、连字符都视为空格
+    text = re.sub(r"[\s._\-+&,:;!?'\"()\[\]{}【】（）《》「」]+", " ", text)
+
+    season = episode = None
+    match = _SEASON_EPISODE_RE.search(text)
+    if match:
+        season = int(match.group(1) or match.group(3))
+        episode = int(match.group(2) or match.group(4))
+        text = text[:match.start()] + " " + text[match.end():]
+    else:
+        match = _SEASON_RE.search(text)
+        if match:
+            season = parse_number(next(g for g in match.groups() if g))
+            text = text[:match.start()] + " " + text[match.end():]
+        match = _EPISODE_RE.search(text)
+        if match:
+            episode = parse_number(next(g for g in match.groups() if g))
+            text = text[:match.start()] + " " + text[match.end():]
+        if episode is None:
+            episode = bracket_episode
+
+    resolution = None
+    match = _RESOLUTION_RE.search(text)
+    if match:
+        resolution = int(match.group(1)) if match.group(1) else 2160
+        text = text[:match.start()] + " " + text[match.end():]
+
+    # 取最后一个年份，标题本身是年份时（如 1917）仍保留在词中
+    years = _YEAR_RE.findall(text)
+    year = int(years[-1]) if years else None
+
+    return ReleaseName(words=set(_TOKEN_RE.findall(text)), season=season, episode=episode,
+                       resolution=resolution, group=group, year=year)
+
+
+class ReleaseIndex:
+    """
+    发布名称的倒排索引：按种子名称和文件名的词建立，查询时按词的稀有程度为候选种子打分排序
+    """
+    # 出现在超过此比例种子中的词不参与召回，只参与打分
+    COMMON_RATIO = 0.2
+    # 索引中没有的词的权重
+    UNKNOWN_WEIGHT = 1.0
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 词 -> {hash}
+        self._postings: Dict[str, Set[str]] = {}
+        # hash -> (种子名称解析结果, [文件名解析结果])
+        self._releases: Dict[str, Tuple[ReleaseName, List[ReleaseName]]] = {}
+        # hash -> 种子名称和文件名的全部词
+        self._words: Dict[str, Set[str]] = {}
+
+    def __len__(self):
+        return len(self._releases)
+
+    def set_name(self, torrent_hash: str, name: str):
+        """
+        新增种子或更新种子名称
+        """
+        with self._lock:
+            _, files = self._releases.get(torrent_hash) or (None, [])
+            self._set(torrent_hash, parse_release(name), files)
+
+    def set_files(self, torrent_hash: str, names: Iterable[str]):
+        """
+        设置种子的文件名
+        """
+        with self._lock:
+            release, _ = self._releases.get(torrent_hash) or (parse_release(""), [])
+            self._set(torrent_hash, release, [parse_release(name) for name in names])
+
+    def remove(self, torrent_hash: str):
+        with self._lock:
+            self._releases.pop(torrent_hash, None)
+            self._unlink(torrent_hash, self._words.pop(torrent_hash, set()))
+
+    def clear(self):
+        with self._lock:
+            self._postings = {}
+            self._releases = {}
+            self._words = {}
+
+    def _set(self, torrent_hash: str, release: ReleaseName, files: List[ReleaseName]):
+        words = set(release.words)
+        for file in files:
+            words |= file.words
+        old = self._words.get(torrent_hash, set())
+        self._unlink(torrent_hash, old - words)
+        for word in words - old:
+            self._postings.setdefault(word, set()).add(torrent_hash)
+        self._releases[torrent_hash] = (release, files)
+        self._words[torrent_hash] = words
+
+    def _unlink(self, torrent_hash: str, words: Iterable[str]):
+        for word in words:
+            hashes = self._postings.get(word)
+            if hashes:
+                hashes.discard(torrent_hash)
+                if not hashes:
+                    self._postings.pop(word, None)
+
+    def rank(self, file_path: str, limit: int = 5, scope=None) -> List[Tuple[str, float]]:
+        """
+        按相似度排序的候选种子 [(hash, 得分)]，得分在0到1之间
+
+        scope 为判断种子是否在清理范围内的函数
+        """
+        query = parse_release(file_path)
+        if not query.words:
+            return []
+        with self._lock:
+            total = max(1, len(self._releases))
+            recall = [w for w in query.words if w in self._postings]
+            if not recall:
+                return []
+            # 词越稀有权重越高，索引中没有的词（如剧集标题）按常见词计
+            weights = {w: math.log(1 + total / len(self._postings[w])) if w in self._postings
+                       else self.UNKNOWN_WEIGHT for w in query.words}
+            # 只由较稀有的词召回候选，常见词都不稀有时全部参与
+            recall = [w for w in recall if len(self._postings[w]) <= max(10, total * self.COMMON_RATIO)] or recall
+            candidates: Set[str] = set()
+            for word in recall:
+                candidates |= self._postings[word]
+            if scope:
+                candidates = {h for h in candidates if scope(h)}
+            query_weight = sum(weights.values())
+            scored = []
+            for torrent_hash in candidates:
+                words = self._words[torrent_hash]
+                score = sum(weight for word, weight in weights.items() if word in words) / query_weight
+                score *= self._score_fields(query, *self._releases[torrent_hash])
+                if score > 0:
+                    scored.append((torrent_hash, min(1.0, score)))
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        return scored[:limit]
+
+    @staticmethod
+    def _score_fields(query: ReleaseName, release: ReleaseName, files: List[ReleaseName]) -> float:
+        """
+        按季集、年份、分辨率和发布组调整得分，季集或年份不符时排除
+        """
+        factor = 1.0
+        if query.year:
+            # 年份不一致时是同名的其他作品；标题本身是年份时（如 1917）年份会出现在对方的词中
+            years = {str(r.year) for r in [release] + files if r.year}
+            words = release.words.union(*(f.words for f in files))
+            if years and str(query.year) not in words and not years & query.words:
+                return 0.0
+        if query.season is not None or query.episode is not None:
+            episodes = {(f.season if f.season is not None else release.season, f.episode)
+                        for f in files if f.episode is not None}
+            if episodes:
+                # 已知文件列表时按具体集数比较
+                if not any((query.season is None or s is None or s == query.season) and e == query.episode
+                           for s, e in episodes):
+                    return 0.0
+            elif release.season is not None or release.episode is not None:
+                if query.season is not None and release.season is not None and release.season != query.season:
+                    return 0.0
+                if query.episode is not None and release.episode is not None \
+                        and release.episode != query.episode:
+                    return 0.0
+                # 季包未获取文件列表，无法确认具体集数
+                if release.episode is None:
+                    factor *= 0.9
+            else:
+                factor *= 0.6
+        if query.resolution and release.resolution:
+            factor *= 1.05 if query.resolution == release.resolution else 0.8
+        if query.group and release.group:
+            factor *= 1.1 if query.group == release.group else 0.9
+        return factor
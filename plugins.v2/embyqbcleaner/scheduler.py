@@ -0,0 +1,97 @@
+import heapq
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# (实例名称, 种子hash)
+DeferredKey = Tuple[str, str]
+
+
+class DeferredDeletions:
+    """
+    推迟删除的种子：按到期时间排列的最小堆，每次只取出已到期的种子重新检查
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # [(到期时间, 实例名称, 种子hash)]，重新安排后旧的堆元素在取出时跳过
+        self._heap: List[Tuple[float, str, str]] = []
+        # (实例名称, 种子hash) -> {"due": 到期时间, "items": [媒体项]}
+        self._jobs: Dict[DeferredKey, Dict[str, Any]] = {}
+        # 是否有未持久化的变更
+        self.dirty = False
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, key: DeferredKey):
+        return key in self._jobs
+
+    def add(self, key: DeferredKey, item_keys: Iterable[str], due: float):
+        """
+        加入推迟删除的种子，已存在时合并媒体项并保留原到期时间
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = {"due": due, "items": []}
+                heapq.heappush(self._heap, (due, key[0], key[1]))
+            job["items"] = list(dict.fromkeys(job["items"] + [k for k in item_keys if k]))
+            self.dirty = True
+
+    def pop_due(self, now: float, limit: int) -> List[Tuple[DeferredKey, List[str]]]:
+        """
+        取出最多limit个已到期的种子
+        """
+        due_jobs = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due_jobs) < limit:
+                due, name, torrent_hash = heapq.heappop(self._heap)
+                key = (name, torrent_hash)
+                job = self._jobs.get(key)
+                if job is None or job["due"] != due:
+                    continue
+                self._jobs.pop(key)
+                due_jobs.append((key, job["items"]))
+            if due_jobs:
+                self.dirty = True
+        return due_jobs
+
+    def remove(self, key: DeferredKey) -> List[str]:
+        """
+        移除种子，返回其媒体项
+        """
+        with self._lock:
+            job = self._jobs.pop(key, None)
+            if job is None:
+                return []
+            self.dirty = True
+            return job["items"]
+
+    def next_due(self) -> Optional[float]:
+        with self._lock:
+            while self._heap:
+                due, name, torrent_hash = self._heap[0]
+                job = self._jobs.get((name, torrent_hash))
+                if job is not None and job["due"] == due:
+                    return due
+                heapq.heappop(self._heap)
+            return None
+
+    def to_list(self) -> List[list]:
+        """
+        导出为可持久化的数据
+        """
+        with self._lock:
+            return [[name, torrent_hash, job["due"], job["items"]]
+                    for (name, torrent_hash), job in self._jobs.items()]
+
+    def load(self, data: Optional[List[list]]):
+        """
+        从持久化数据恢复
+        """
+        with self._lock:
+            self._jobs = {(name, torrent_hash): {"due": due, "items": list(items)}
+                          for name, torrent_hash, due, items in data or []}
+            self._heap = [(job["due"], key[0], key[1]) for key, job in self._jobs.items()]
+            heapq.heapify(self._heap)
+            self.dirty = False
@@ -0,0 +1,323 @@
+import os
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Any, Set, Iterable
+
+from app.log import logger
+
+from .breaker import CircuitOpenError
+from .releaseindex import ReleaseIndex
+
+
+# 媒体文件扩展名，content_path 以此结尾时视为单文件种子
+MEDIA_EXTS = {".mkv", ".mp4", ".avi", ".ts", ".m2ts", ".iso", ".rmvb", ".wmv",
+              ".mov", ".flv", ".webm", ".mpg", ".mpeg", ".m4v", ".strm"}
+
+
+def normalize_name(path: str) -> str:
+    """
+    归一化文件名：取路径最后一段，统一Unicode形式并忽略大小写
+    """
+    if not path:
+        return ""
+    name = str(path).replace("\\", "/").rstrip("/").rsplit("/", 1)[-1]
+    return unicodedata.normalize("NFC", name).strip().lower()
+
+
+class TorrentIndex:
+    """
+    种子文件索引：维护 文件名、(文件名, 大小) 到种子hash的映射，
+    以及种子名称和文件名的发布名称索引，文件名不一致时按相似度查找
+    """
+    # 持久化数据格式版本
+    VERSION = 1
+    # 需要缓存的种子字段
+    TORRENT_FIELDS = ("name", "size", "added_on", "uploaded", "tracker", "tags",
+                      "category", "save_path", "content_path")
+    # 影响文件路径、清理范围和名称匹配的字段，变化时递增版本
+    PATH_FIELDS = ("name", "tags", "category", "save_path", "content_path")
+    # 做种期间持续变化的字段，只更新内存，不触发持久化（重启后由全量同步补齐）
+    VOLATILE_FIELDS = ("uploaded",)
+    # 并发获取文件列表的线程数
+    FETCH_WORKERS = 8
+    # 按相似度匹配的最低得分
+    RANK_MIN_SCORE = 0.6
+    # 前两名得分差距小于此值时视为无法区分，需获取文件列表确认
+    RANK_MARGIN = 0.15
+    # 无法区分时最多获取文件列表的候选种子数
+    RANK_FETCH = 5
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # 同一时间只允许一次增量同步，避免并发请求打乱rid序号
+        self._sync_lock = threading.Lock()
+        # hash -> 种子字段
+        self.torrents: Dict[str, Dict[str, Any]] = {}
+        # hash -> [(归一化文件名, 文件大小)]
+        self.files: Dict[str, List[Tuple[str, int]]] = {}
+        self._by_name: Dict[str, Set[str]] = {}
+        self._by_name_size: Dict[Tuple[str, int], Set[str]] = {}
+        # 种子名称和文件名的发布名称索引
+        self.releases = ReleaseIndex()
+        # 分类、标签过滤，为空时不限制
+        self.categories: Set[str] = set()
+        self.tags: Set[str] = set()
+        # sync/maindata 的响应序号，与qBittorrent会话绑定，不做持久化
+        self.rid = 0
+        # 是否有未持久化的变更
+        self.dirty = False
+        # 种子增删、路径、名称或清理范围变化时递增，供依赖种子列表的索引判断是否需要同步
+        self.generation = 0
+
+    def __len__(self):
+        return len(self.torrents)
+
+    def __contains__(self, torrent_hash: str):
+        return torrent_hash in self.torrents
+
+    def update_torrent(self, torrent_hash: str, fields: Dict[str, Any]):
+        """
+        新增或合并种子字段
+        """
+        with self._lock:
+            torrent = self.torrents.setdefault(torrent_hash, {})
+            for key in self.TORRENT_FIELDS:
+                if key in fields and torrent.get(key) != fields[key]:
+                    torrent[key] = fields[key]
+                    if key not in self.VOLATILE_FIELDS:
+                        self.dirty = True
+                    if key in self.PATH_FIELDS:
+                        self.generation += 1
+                    if key == "name":
+                        self.releases.set_name(torrent_hash, fields[key] or "")
+
+    def set_files(self, torrent_hash: str, files: Iterable[Tuple[str, int]]):
+        """
+        设置种子的文件列表并更新反向索引
+        """
+        with self._lock:
+            self._unlink_files(torrent_hash)
+            entries = [(normalize_name(name), int(size or 0)) for name, size in files]
+            self.files[torrent_hash] = entries
+            for name, size in entries:
+                self._by_name.setdefault(name, set()).add(torrent_hash)
+                self._by_name_size.setdefault((name, size), set()).add(torrent_hash)
+            self.releases.set_files(torrent_hash, [name for name, _ in entries])
+            self.dirty = True
+
+    def remove(self, torrent_hash: str):
+        """
+        从索引中移除种子
+        """
+        with self._lock:
+            self._unlink_files(torrent_hash)
+            self.files.pop(torrent_hash, None)
+            self.releases.remove(torrent_hash)
+            if self.torrents.pop(torrent_hash, None) is not None:
+                self.dirty = True
+                self.generation += 1
+
+    def _unlink_files(self, torrent_hash: str):
+        for name, size in self.files.get(torrent_hash) or []:
+            for mapping, key in ((self._by_name, name), (self._by_name_size, (name, size))):
+                hashes = mapping.get(key)
+                if hashes:
+                    hashes.discard(torrent_hash)
+                    if not hashes:
+                        mapping.pop(key, None)
+
+    def set_filters(self, categories: Iterable[str] = None, tags: Iterable[str] = None):
+        """
+        设置清理范围：仅处理指定分类、带有指定标签的种子
+        """
+        with self._lock:
+            self.categories = {c for c in categories or [] if c}
+            self.tags = {t for t in tags or [] if t}
+            self.generation += 1
+
+    def in_scope(self, torrent_hash: str) -> bool:
+        """
+        种子是否在清理范围内
+        """
+        torrent = self.torrents.get(torrent_hash)
+        if torrent is None:
+            return False
+        if self.categories and torrent.get("category") not in self.categories:
+            return False
+        if self.tags:
+            tags = {t.strip() for t in (torrent.get("tags") or "").split(",")}
+            if not tags & self.tags:
+                return False
+        return True
+
+    def media_files(self, torrent_hash: str) -> List[Tuple[str, int]]:
+        """
+        种子中的正片文件，忽略明显小于最大文件的样片、花絮
+        """
+        with self._lock:
+            files = [f for f in self.files.get(torrent_hash) or []
+                     if os.path.splitext(f[0])[1] in MEDIA_EXTS]
+        if not files:
+            return []
+        largest = max(size for _, size in files)
+        return [f for f in files if f[1] >= largest * 0.2]
+
+    def lookup(self, file_path: str, size: Optional[int] = None) -> Optional[str]:
+        """
+        根据媒体文件路径查找种子hash，提供大小时优先精确匹配
+        """
+        return self.match(file_path, size)[0]
+
+    def match(self, file_path: str, size: Optional[int] = None) -> Tuple[Optional[str], bool]:
+        """
+        查找种子hash并给出是否可信：文件名和大小都一致，或未提供大小时文件名只属于一个种子
+        """
+        name = normalize_name(file_path)
+        if not name:
+            return None, False
+        with self._lock:
+            hashes = None
+            confident = False
+            if size:
+                hashes = self._by_name_size.get((name, int(size)))
+                confident = bool(hashes)
+            if not hashes:
+                hashes = self._by_name.get(name)
+            hashes = [h for h in hashes or [] if self.in_scope(h)]
+            if not hashes:
+                return None, False
+            if not size and len(hashes) == 1:
+                confident = True
+            # 同名文件存在于多个种子时，取最早添加的种子
+            return min(hashes, key=lambda h: (self.torrents.get(h, {}).get("added_on") or 0, h)), confident
+
+    def match_release(self, qb, file_path: str, size: Optional[int] = None) -> Tuple[Optional[str], bool]:
+        """
+        文件名未精确匹配时，按发布名称相似度排序候选种子；仅在前几名无法区分时获取其文件列表后重新匹配。
+        相似度只用于选出候选，选中的种子须有大小一致或文件名一致的文件才返回，否则视为未找到
+        """
+        ranked = self.releases.rank(file_path, limit=self.RANK_FETCH, scope=self.in_scope)
+        if self._ambiguous(ranked):
+            pending = [h for h, _ in ranked if h not in self.files]
+            if not pending:
+                return None, False
+            self.fetch_files(qb, pending)
+            torrent_hash, confident = self.match(file_path, size)
+            if torrent_hash:
+                return torrent_hash, confident
+            # 文件列表补充了集数等信息，重新排序
+            ranked = self.releases.rank(file_path, limit=self.RANK_FETCH, scope=self.in_scope)
+            if self._ambiguous(ranked):
+                return None, False
+        if not ranked or ranked[0][1] < self.RANK_MIN_SCORE:
+            return None, False
+        torrent_hash = ranked[0][0]
+        if torrent_hash not in self.files:
+            self.fetch_files(qb, [torrent_hash])
+        name = normalize_name(file_path)
+        if any((size and file_size == int(size)) or file_name == name
+               for file_name, file_size in self.files.get(torrent_hash) or []):
+            return torrent_hash, True
+        return None, False
+
+    def _ambiguous(self, ranked: List[Tuple[str, float]]) -> bool:
+        """
+        得分最高的候选是否无法与其余候选区分
+        """
+        if not ranked or ranked[0][1] < self.RANK_MIN_SCORE:
+            return bool(ranked)
+        return len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.RANK_MARGIN
+
+    def refresh(self, qb) -> bool:
+        """
+        通过 sync/maindata 增量同步种子列表：仅传输新增、变更和删除的种子，
+        已删除的种子立即移出索引。单文件种子直接记录文件，其余种子的文件列表在查找时按需获取
+        """
+        with self._sync_lock:
+            data = qb.sync_maindata(rid=self.rid)
+            with self._lock:
+                torrents = data.get("torrents") or {}
+                if data.get("full_update"):
+                    # 全量更新时以返回结果为准，移除本地多余的种子
+                    for torrent_hash in set(self.torrents) - set(torrents):
+                        self.remove(torrent_hash)
+                for torrent_hash in data.get("torrents_removed") or []:
+                    self.remove(torrent_hash)
+                for torrent_hash, fields in torrents.items():
+                    self.update_torrent(torrent_hash, fields)
+                self.rid = data.get("rid") or 0
+                # 只检查本次新增或变更的种子，首次同步会返回全部种子
+                self._local_files([h for h in torrents if h not in self.files and self.in_scope(h)])
+        return self.dirty
+
+    def _local_files(self, hashes: Iterable[str]) -> List[str]:
+        """
+        单文件种子直接由 content_path 和大小得出文件列表，返回其余需要请求的种子
+        """
+        pending = []
+        for torrent_hash in hashes:
+            torrent = self.torrents.get(torrent_hash) or {}
+            content_path = torrent.get("content_path") or ""
+            if os.path.splitext(content_path)[1].lower() in MEDIA_EXTS:
+                self.set_files(torrent_hash, [(content_path, torrent.get("size"))])
+            else:
+                pending.append(torrent_hash)
+        return pending
+
+    def fetch_files(self, qb, hashes: List[str]):
+        """
+        获取指定种子的文件列表，单文件种子不发送请求，其余种子并发请求；
+        并发数由会话按响应耗时限制，qBittorrent熔断时不再继续请求
+        """
+        pending = self._local_files(hashes)
+        if not pending:
+            return
+
+        def _fetch(torrent_hash: str):
+            try:
+                return torrent_hash, qb.torrents_files(torrent_hash)
+            except CircuitOpenError:
+                raise
+            except Exception as e:
+                logger.warning(f"获取种子文件列表失败 {torrent_hash}: {str(e)}")
+                return torrent_hash, None
+
+        with ThreadPoolExecutor(max_workers=min(self.FETCH_WORKERS, len(pending))) as executor:
+            for torrent_hash, files in executor.map(_fetch, pending):
+                # 元数据尚未下载完成的种子暂不记录，下次刷新时重试
+                if files:
+                    self.set_files(torrent_hash, [(f.get("name"), f.get("size")) for f in files])
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        导出为可持久化的数据
+        """
+        with self._lock:
+            return {
+                "version": self.VERSION,
+                "torrents": self.torrents,
+                "files": {h: [list(entry) for entry in entries] for h, entries in self.files.items()}
+            }
+
+    def load(self, data: Optional[Dict[str, Any]]) -> bool:
+        """
+        从持久化数据恢复索引
+        """
+        if not data or data.get("version") != self.VERSION:
+            return False
+        with self._lock:
+            self.torrents = {h: dict(t) for h, t in (data.get("torrents") or {}).items()}
+            self.files = {}
+            self.rid = 0
+            self._by_name = {}
+            self._by_name_size = {}
+            self.releases.clear()
+            for torrent_hash, torrent in self.torrents.items():
+                self.releases.set_name(torrent_hash, torrent.get("name") or "")
+            for torrent_hash, entries in (data.get("files") or {}).items():
+                if torrent_hash in self.torrents:
+                    self.set_files(torrent_hash, [tuple(entry) for entry in entries])
+            self.dirty = False
+            self.generation += 1
+        return True
@@ -0,0 +1,82 @@
+import queue
+import threading
+from typing import Any, Callable, List, Optional
+
+from app.log import logger
+
+
+class WorkerPool:
+    """
+    有界任务队列：接收方立即返回，由固定数量的工作线程异步处理
+    """
+    # 队列结束标记
+    _STOP = object()
+
+    def __init__(self, name: str, handler: Callable[[Any], None], workers: int = 2, queue_size: int = 100):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self._queue: Optional[queue.Queue] = None
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def running(self) -> bool:
+        return bool(self._threads)
+
+    @property
+    def qsize(self) -> int:
+        return self._queue.qsize() if self._queue else 0
+
+    def start(self):
+        """
+        启动工作线程
+        """
+        if self.running:
+            return
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, job: Any) -> bool:
+        """
+        提交任务，队列已满时返回False
+        """
+        if not self.running:
+            return False
+        try:
+            self._queue.put_nowait(job)
+            return True
+        except queue.Full:
+            logger.warning(f"{self.name} 处理队列已满（{self.queue_size}），丢弃任务")
+            return False
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            try:
+                if job is self._STOP:
+                    return
+                self.handler(job)
+            except Exception as e:
+                logger.error(f"{self.name} 处理任务出错: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    def stop(self, timeout: float = 30):
+        """
+        处理完队列中剩余的任务后停止工作线程
+        """
+        if not self.running:
+            return
+        threads, self._threads = self._threads, []
+        pending = self._queue.qsize()
+        if pending:
+            logger.info(f"{self.name} 等待处理剩余的 {pending} 个任务")
+        for _ in threads:
+            # 结束标记排在已有任务之后，保证队列先被处理完
+            self._queue.put(self._STOP)
+        for thread in threads:
+            thread.join(timeout=timeout)